@@ -0,0 +1,415 @@
+# ==========================================================================================
+# Name:   Benchmark.py
+# Goal:   Measure the speed of the transliteration engines on synthetic corpora
+# Author: Erwin R. Komen
+# History:
+# 18/oct/2026 - created
+#
+# Example:
+#   python Benchmark.py -n 500000 -o results.json
+#   python Benchmark.py -b baseline.json -w        (store the results as the baseline)
+#   python Benchmark.py -b baseline.json           (compare with the stored baseline)
+#   python Benchmark.py -v 200000                  (a larger vocabulary: fewer repeated words)
+# ==========================================================================================
+import sys, getopt, os.path, re, json, time, random, hashlib, platform
+import tempfile, tracemalloc
+
+# The projects whose engines are measured
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for sProject in ["Lezgi", "flexche", "Chechen"]:
+    sys.path.insert(0, os.path.join(root_dir, sProject))
+
+import util
+
+# ============================= LOCAL VARIABLES ====================================
+errHandle = util.ErrHandle()
+re_words = re.compile(r"\w+")
+# Version of the layout of the JSON results
+result_version = 1
+# Number of different words in a synthetic corpus (see the -v option)
+vocabulary_size = 5000
+# The words of a text are separated by these, weighted
+separators = [(" ", 80), (", ", 8), (". ", 6), ("-", 3), ("? ", 1), (".\n", 2)]
+
+
+# ----------------------------------------------------------------------------------
+# Name :    main
+# Goal :    Main body of the function: run the benchmarks and report them
+# History:
+# 18/oct/2026    ERK Created
+# ----------------------------------------------------------------------------------
+def main(prgName, argv) :
+    # The parameters we pass on
+    options = {'chars': 200000,
+               'seed': 1,
+               'vocabulary': vocabulary_size,
+               'repeat': 3,
+               'output': '',
+               'baseline': '',
+               'write': False,
+               'tolerance': 0.2,
+               'benchmarks': []}
+
+    try:
+        sSyntax = prgName + ' [-n chars -r repeat -s seed -v vocabulary -k benchmarks -o output.json -b baseline.json -w -t tolerance]'
+        # get all the arguments
+        try:
+            # Get arguments and options
+            opts, args = getopt.getopt(argv, "hn:r:s:v:k:o:b:wt:",
+                ["-chars=", "-repeat=", "-seed=", "-vocabulary=", "-benchmarks=", "-output=", "-baseline=", "-write", "-tolerance="])
+        except getopt.GetoptError:
+            errHandle.DoError(sSyntax, True)
+
+        # Walk all the arguments
+        for opt, arg in opts:
+            if opt == '-h':
+                print(sSyntax)
+                print("Benchmarks: " + ", ".join(sName for sName, sCorpus, prepare in benchmarks))
+                sys.exit(0)
+            elif opt in ("-n", "--chars"):
+                options['chars'] = int(arg)
+            elif opt in ("-r", "--repeat"):
+                options['repeat'] = max(1, int(arg))
+            elif opt in ("-s", "--seed"):
+                options['seed'] = int(arg)
+            elif opt in ("-v", "--vocabulary"):
+                # The number of different words in the corpora that repeat words
+                options['vocabulary'] = max(1, int(arg))
+            elif opt in ("-k", "--benchmarks"):
+                # A semicolon-separated list of benchmark names
+                options['benchmarks'] = re.split(r"\s*;\s*", arg)
+            elif opt in ("-o", "--output"):
+                options['output'] = arg
+            elif opt in ("-b", "--baseline"):
+                options['baseline'] = arg
+            elif opt in ("-w", "--write"):
+                # Store the results as the new baseline
+                options['write'] = True
+            elif opt in ("-t", "--tolerance"):
+                options['tolerance'] = float(arg)
+
+        oResults = run_benchmarks(options)
+
+        # Compare with the baseline (unless it is to be replaced)
+        bOkay = True
+        if options['baseline'] != "" and not options['write']:
+            if os.path.isfile(options['baseline']):
+                with open(options['baseline'], "r", encoding="utf-8") as fp:
+                    oBaseline = json.load(fp)
+                bOkay = compare_baseline(oResults, oBaseline, options['tolerance'])
+            else:
+                errHandle.Status("There is no baseline yet: {}".format(options['baseline']))
+
+        sResults = json.dumps(oResults, indent=2, ensure_ascii=False)
+        if options['output'] != "":
+            with open(options['output'], "w", encoding="utf-8") as fp:
+                fp.write(sResults + "\n")
+        else:
+            print(sResults)
+        if options['baseline'] != "" and options['write']:
+            with open(options['baseline'], "w", encoding="utf-8") as fp:
+                fp.write(sResults + "\n")
+            errHandle.Status("Stored baseline: {}".format(options['baseline']))
+        sys.exit(0 if bOkay else 1)
+    except SystemExit:
+        raise
+    except:
+        errHandle.DoError("main")
+        return False
+
+
+# ----------------------------------------------------------------------------------
+# Name :    make_corpus
+# Goal :    Make a synthetic text from the units of a rule table
+# History:
+# 18/oct/2026    ERK Created
+# ----------------------------------------------------------------------------------
+def make_corpus(lCons, lVowels, iChars, iSeed, iVocabulary):
+    """Make a text of about [iChars] characters with words built from consonant and vowel units
+
+    The words come from a vocabulary of [iVocabulary] words, used with Zipf-like
+    frequencies, so that words repeat as they do in real texts. Without a vocabulary
+    (iVocabulary=0) every word is made anew, so that hardly any word repeats."""
+
+    oRandom = random.Random(iSeed)
+
+    def make_word():
+        sWord = "".join(oRandom.choice(lCons) + oRandom.choice(lVowels) for i in range(oRandom.randint(1, 3)))
+        if oRandom.random() < 0.5:
+            sWord += oRandom.choice(lCons)
+        if oRandom.random() < 0.1:
+            sWord = sWord[0].upper() + sWord[1:]
+        return sWord
+
+    lVocabulary = [make_word() for idx in range(iVocabulary)]
+    lWeights = [1.0 / (idx + 1) for idx in range(iVocabulary)]
+    lSeps = [sSep for sSep, iWeight in separators]
+    lSepWeights = [iWeight for sSep, iWeight in separators]
+
+    lText = []
+    iLen = 0
+    while iLen < iChars:
+        # Add the words in blocks, to keep the number of calls down
+        if iVocabulary > 0:
+            lWords = oRandom.choices(lVocabulary, lWeights, k=1000)
+        else:
+            lWords = [make_word() for idx in range(1000)]
+        for sWord, sSep in zip(lWords, oRandom.choices(lSeps, lSepWeights, k=1000)):
+            lText.append(sWord + sSep)
+            iLen += len(sWord) + len(sSep)
+            if iLen >= iChars:
+                break
+    return "".join(lText)
+
+
+def get_latin_units():
+    """The consonant and vowel units of Latin Chechen, from the Latin-to-Cyrillic tables"""
+
+    from latcyr import lst_latin_c, lst_trans_vs
+    # Single consonants only, so that words do not get impossible clusters; the
+    #   capitals are added by make_corpus
+    lCons = [oRow['lat'] for oRow in lst_latin_c if oRow['syl'] == "C"]
+    lVowels = [oRow['lat'] for oRow in lst_trans_vs if oRow['lat'] == oRow['lat'].lower()]
+    return lCons, lVowels
+
+
+def make_latin_corpus(iChars, iSeed, iVocabulary):
+    """Latin Chechen with a Zipf vocabulary"""
+
+    lCons, lVowels = get_latin_units()
+    return make_corpus(lCons, lVowels, iChars, iSeed, iVocabulary)
+
+
+def make_latin_unique_corpus(iChars, iSeed, iVocabulary):
+    """Latin Chechen in which hardly any word repeats (the vocabulary is not used)"""
+
+    lCons, lVowels = get_latin_units()
+    return make_corpus(lCons, lVowels, iChars, iSeed, 0)
+
+
+def make_lezgi_corpus(iChars, iSeed, iVocabulary):
+    """Cyrillic Lezgi, from the letters and digraphs of Lezgi.py"""
+
+    import Lezgi
+    sVowels = "аеёиоуыэюяАЕЁИОУЫЭЮЯ"
+    lLetters = [sKey for sKey in list(Lezgi.translit) + list(Lezgi.digraphs) if sKey[0].isalpha()]
+    lCons = [sKey for sKey in lLetters if not sKey[0] in sVowels]
+    lVowels = [sKey for sKey in lLetters if sKey[0] in sVowels]
+    return make_corpus(lCons, lVowels, iChars, iSeed, iVocabulary)
+
+
+corpora = {"latin": make_latin_corpus, "latin_unique": make_latin_unique_corpus, "lezgi": make_lezgi_corpus}
+
+
+# ----------------------------------------------------------------------------------
+# Name :    prepare_xxx
+# Goal :    Prepare one benchmark: return the function that converts a text, and the
+#           function that resets all caches (so that each run starts cold)
+# History:
+# 18/oct/2026    ERK Created
+# ----------------------------------------------------------------------------------
+def prepare_chechen_do_convert():
+    import convert
+    import chetrans.engine
+
+    def reset():
+        chetrans.engine.engines.clear()
+
+    options = {'switches': []}
+    return (lambda sText: convert.do_convert(sText, options)), reset
+
+
+def prepare_chechen_do_convert_lines():
+    import convert
+    import chetrans.engine
+
+    # One call per line, like the paragraphs of a document in academic2phonemic
+    options = {'switches': []}
+
+    def convert_lines(sText):
+        return "\n".join(convert.do_convert(sLine, options) for sLine in sText.split("\n"))
+
+    return convert_lines, chetrans.engine.engines.clear
+
+
+def prepare_chechen_do_lat2cyr():
+    from latcyr import TranslitChe
+
+    oTranslit = TranslitChe()
+    options = {}
+    return (lambda sText: oTranslit.do_lat2cyr(sText, options)), oTranslit.clear_cache
+
+
+def prepare_flexche_convert_word():
+    import flexche
+    import chetrans.engine
+
+    def convert(sText):
+        return " ".join(flexche.convert_word(sWord) for sWord in re_words.findall(sText))
+
+    return convert, chetrans.engine.engines.clear
+
+
+def prepare_flexche_do_convert():
+    import flexche
+    import chetrans.engine
+
+    options = {'switches': []}
+    return (lambda sText: flexche.do_convert(sText, options)), chetrans.engine.engines.clear
+
+
+def prepare_lezgi_transliterate():
+    import Lezgi
+
+    def convert(sText):
+        # The routine works on files: use a directory that is removed afterwards
+        with tempfile.TemporaryDirectory(prefix="bench_lezgi_") as sDir:
+            sName = os.path.join(sDir, "Text1.txt")
+            with open(sName, "w", encoding="utf-8") as fp:
+                fp.write(sText)
+            lFiles = Lezgi.transliterate([sName], Lezgi.translit, Lezgi.digraphs, Lezgi.nonalphanum)
+            with open(lFiles[0], "r", encoding="utf-8") as fp:
+                return fp.read()
+
+    return convert, None
+
+
+# The benchmarks: name, corpus and the function that prepares it
+benchmarks = [
+    ("chechen.do_convert", "latin", prepare_chechen_do_convert),
+    ("chechen.do_convert.unique", "latin_unique", prepare_chechen_do_convert),
+    ("chechen.do_convert.lines", "latin", prepare_chechen_do_convert_lines),
+    ("chechen.do_convert.lines_unique", "latin_unique", prepare_chechen_do_convert_lines),
+    ("chechen.do_lat2cyr", "latin", prepare_chechen_do_lat2cyr),
+    ("flexche.convert_word", "latin", prepare_flexche_convert_word),
+    ("flexche.do_convert", "latin", prepare_flexche_do_convert),
+    ("lezgi.transliterate", "lezgi", prepare_lezgi_transliterate)
+    ]
+
+
+# ----------------------------------------------------------------------------------
+# Name :    run_benchmarks
+# Goal :    Run all (selected) benchmarks
+# History:
+# 18/oct/2026    ERK Created
+# ----------------------------------------------------------------------------------
+def run_benchmarks(options):
+    """Run the benchmarks in [options] and return the results as a dictionary"""
+
+    oResults = dict(version=result_version,
+                    python=platform.python_version(),
+                    platform=platform.platform(),
+                    chars=options['chars'],
+                    seed=options['seed'],
+                    vocabulary=options['vocabulary'],
+                    repeat=options['repeat'],
+                    corpora={},
+                    benchmarks={})
+    dicCorpus = {}
+    for sName, sCorpus, prepare in benchmarks:
+        if len(options['benchmarks']) > 0 and not sName in options['benchmarks']:
+            continue
+        errHandle.Status("Benchmark: {}".format(sName))
+        try:
+            # Make the corpus (once for all benchmarks that use it)
+            if not sCorpus in dicCorpus:
+                fStart = time.perf_counter()
+                sText = corpora[sCorpus](options['chars'], options['seed'], options['vocabulary'])
+                dicCorpus[sCorpus] = sText
+                oResults['corpora'][sCorpus] = dict(
+                    chars=len(sText), words=len(re_words.findall(sText)),
+                    sha1=hashlib.sha1(sText.encode("utf-8")).hexdigest(),
+                    seconds=round(time.perf_counter() - fStart, 4))
+            oResults['benchmarks'][sName] = run_one(prepare, sCorpus, dicCorpus[sCorpus], options['repeat'])
+        except:
+            # A benchmark that can not run (e.g. a missing library) is reported, not fatal
+            sMsg = str(sys.exc_info()[1])
+            errHandle.Status("  skipped: {}".format(sMsg))
+            oResults['benchmarks'][sName] = dict(corpus=sCorpus, skipped=sMsg)
+    return oResults
+
+
+def run_one(prepare, sCorpus, sText, iRepeat):
+    """Measure one benchmark on [sText]
+
+    The stages are: setup (import and compile), convert (with empty caches) and
+    convert_again (the same text with the caches filled). The times are the best of
+    [iRepeat] runs. The peak memory is measured in an extra run, since tracing the
+    memory slows the conversion down."""
+
+    dicStages = {}
+    fStart = time.perf_counter()
+    convert, reset = prepare()
+    dicStages['setup'] = time.perf_counter() - fStart
+
+    lCold = []
+    lWarm = []
+    for idx in range(iRepeat):
+        if reset is not None: reset()
+        fStart = time.perf_counter()
+        sOutput = convert(sText)
+        lCold.append(time.perf_counter() - fStart)
+        fStart = time.perf_counter()
+        convert(sText)
+        lWarm.append(time.perf_counter() - fStart)
+    dicStages['convert'] = min(lCold)
+    dicStages['convert_again'] = min(lWarm)
+
+    # Peak memory of a cold conversion
+    if reset is not None: reset()
+    tracemalloc.start()
+    convert(sText)
+    iSize, iPeak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    fSeconds = max(dicStages['convert'], 1e-9)
+    iWords = len(re_words.findall(sText))
+    return dict(corpus=sCorpus,
+                chars_per_sec=round(len(sText) / fSeconds),
+                words_per_sec=round(iWords / fSeconds),
+                peak_memory_kb=round(iPeak / 1024),
+                stages={k: round(v, 6) for k, v in dicStages.items()},
+                output_sha1=hashlib.sha1(sOutput.encode("utf-8")).hexdigest())
+
+
+# ----------------------------------------------------------------------------------
+# Name :    compare_baseline
+# Goal :    Compare the results with an earlier (stored) baseline
+# History:
+# 18/oct/2026    ERK Created
+# ----------------------------------------------------------------------------------
+def compare_baseline(oResults, oBaseline, fTolerance):
+    """Report the changes since [oBaseline]; return False if anything got slower or changed
+
+    A benchmark is slower when its chars/sec dropped by more than [fTolerance]. Its
+    output has changed when the same corpus gives another result, which happens
+    whenever the rule tables change."""
+
+    bOkay = True
+    for sName, oNew in oResults['benchmarks'].items():
+        oOld = oBaseline.get('benchmarks', {}).get(sName)
+        if oOld is None or 'skipped' in oNew or 'skipped' in oOld:
+            continue
+        fRatio = oNew['chars_per_sec'] / max(oOld['chars_per_sec'], 1)
+        oNew['baseline_ratio'] = round(fRatio, 3)
+        sMsg = "{}: {:.2f}x baseline speed".format(sName, fRatio)
+        if fRatio < 1.0 - fTolerance:
+            sMsg += "  SLOWER"
+            bOkay = False
+        # The output can only be compared on the same corpus
+        oCorpusNew = oResults['corpora'].get(oNew['corpus'], {})
+        oCorpusOld = oBaseline.get('corpora', {}).get(oOld['corpus'], {})
+        if oCorpusNew.get('sha1') == oCorpusOld.get('sha1') and oNew['output_sha1'] != oOld['output_sha1']:
+            oNew['output_changed'] = True
+            sMsg += "  OUTPUT CHANGED"
+            bOkay = False
+        errHandle.Status(sMsg)
+    return bOkay
+
+
+# ----------------------------------------------------------------------------------
+# Goal :  If user calls this as main, then follow up on it
+# ----------------------------------------------------------------------------------
+if __name__ == "__main__":
+    # Call the main function with two arguments: program name + remainder
+    main(sys.argv[0], sys.argv[1:])
@@ -5,12 +5,16 @@
 # History:  
 # 18/dec/2017 - created
 # ==========================================================================================
-import sys, getopt, os.path, re
+import sys, getopt, os.path, re, glob, time
+import multiprocessing
 import util
 import convert
+import docxstream
+from latcyr import TranslitChe
 
 # ============================= LOCAL VARIABLES ====================================
 errHandle = util.ErrHandle()
+worker_options = None   # Options of one worker process in batch mode
 
 # ----------------------------------------------------------------------------------
 # Name :    main
@@ -32,6 +36,7 @@ def main(prgName, argv) :
                'convert': '',
                'cyrillic': bCyrillic,
                'switches': [],
+               'workers': 0,
                'oerr': errHandle}        
 
     try:
@@ -39,12 +44,12 @@ def main(prgName, argv) :
         index = prgName.rfind("\\")
         if (index > 0) :
             prgName = prgName[index+1:]
-        sSyntax = prgName + ' [-s styles, -t target, -w switches, -c arg, -a cyrillic -v macron] -i <inputfile> -o <outputfile>'
+        sSyntax = prgName + ' [-s styles, -t target, -w switches, -c arg, -a cyrillic -v macron -j workers -u incremental|skip -e stream -l quiet|summary|verbose] -i <inputfile|directory|glob> -o <outputfile|directory>'
         # get all the arguments
         try:
             # Get arguments and options
-            opts, args = getopt.getopt(argv, "hi:o:s:t:c:w:a:v:", 
-                ["-inputfile=","-outputfile=", "-styles=", "-target=", "-convert=", "-switches=", "-add=", "-vowel="])
+            opts, args = getopt.getopt(argv, "hi:o:s:t:c:w:a:v:j:u:e:l:", 
+                ["-inputfile=","-outputfile=", "-styles=", "-target=", "-convert=", "-switches=", "-add=", "-vowel=", "-jobs=", "-update=", "-engine=", "-log="])
         except getopt.GetoptError:
             errHandle.DoError(sSyntax, True)
             
@@ -74,6 +79,19 @@ def main(prgName, argv) :
                 options['convert'] = arg
             elif opt in ("-a", "--add"):
                 options['add'] = arg
+            elif opt in ("-j", "--jobs"):
+                options['workers'] = int(arg)
+            elif opt in ("-u", "--update"):
+                # incremental = re-use earlier conversions; skip = also skip unchanged documents
+                options['update'] = arg
+            elif opt in ("-e", "--engine"):
+                # stream = rewrite the OOXML of the document directly instead of using python-docx
+                #   (this also keeps run formatting such as bold, which python-docx drops)
+                options['engine'] = arg
+            elif opt in ("-l", "--log"):
+                # quiet = errors only; summary = one progress line; verbose = every conversion
+                options['log'] = arg
+                errHandle.set_level(arg)
 
         # Check if all arguments are there
         if (options['input'] == '' or options['output'] == ''):
@@ -91,8 +109,12 @@ def main(prgName, argv) :
             errHandle.Status("Target is '"+options['target']+"'")
 
 
+        # A directory or a glob pattern as input means: convert a batch of files
+        if is_batch(options['input']):
+            if not convert_batch(options):
+                errHandle.Status("The conversion could not be completed", True)
         # Now call the function that converts the input into the output
-        if not convert.academic2phonemic(options):
+        elif not do_conversion(options):
             errHandle.Status("The conversion could not be completed", True)
         
         # Inform the user that all is well
@@ -103,6 +125,134 @@ def main(prgName, argv) :
         return False
 
 
+# ----------------------------------------------------------------------------------
+# Name :    do_conversion
+# Goal :    Convert one file with the engine chosen in the options
+# History:
+# 18/oct/2026    ERK Created
+# ----------------------------------------------------------------------------------
+def do_conversion(options):
+    """Convert options['input'] into options['output'] with the python-docx or the stream engine"""
+
+    if options.get('engine') == "stream":
+        return docxstream.academic2phonemic_stream(options)
+    return convert.academic2phonemic(options)
+
+
+# ----------------------------------------------------------------------------------
+# Name :    is_batch
+# Goal :    Check if the input specifies a batch of files
+# History:
+# 18/oct/2026    ERK Created
+# ----------------------------------------------------------------------------------
+def is_batch(sInput):
+    """The input is a batch if it is a directory or a glob pattern"""
+
+    return os.path.isdir(sInput) or any(ch in sInput for ch in "*?[")
+
+
+# ----------------------------------------------------------------------------------
+# Name :    init_worker
+# Goal :    Prepare one worker process of the batch mode
+# History:
+# 18/oct/2026    ERK Created
+# ----------------------------------------------------------------------------------
+def init_worker(options):
+    """Build the converters once for this worker process"""
+
+    global worker_options
+
+    worker_options = dict(options)
+    worker_options['oerr'] = util.ErrHandle(options.get('log', "summary"))
+    worker_options['translit'] = TranslitChe()
+    # Compile the conversion rules for these switches right away
+    convert.get_engine(options['switches'])
+
+
+# ----------------------------------------------------------------------------------
+# Name :    convert_one
+# Goal :    Convert one file within a worker process
+# History:
+# 18/oct/2026    ERK Created
+# ----------------------------------------------------------------------------------
+def convert_one(job):
+    """Convert the (input, output) file pair in [job] and report success and time taken"""
+
+    sInput, sOutput = job
+    options = dict(worker_options)
+    options['input'] = sInput
+    options['output'] = sOutput
+    fStart = time.time()
+    try:
+        bOkay = do_conversion(options)
+    except:
+        options['oerr'].DoError("convert_one")
+        bOkay = False
+    return sInput, bOkay, time.time() - fStart
+
+
+# ----------------------------------------------------------------------------------
+# Name :    convert_batch
+# Goal :    Convert all .docx files in a directory (or glob) with a pool of processes
+# History:
+# 18/oct/2026    ERK Created
+# ----------------------------------------------------------------------------------
+def convert_batch(options):
+    """Convert all files specified by options['input'] into the directory options['output']"""
+
+    try:
+        sInput = options['input']
+        sOutDir = options['output']
+        iWorkers = options.get('workers') or os.cpu_count() or 1
+
+        # Collect the input files
+        if os.path.isdir(sInput):
+            lFiles = sorted(glob.glob(os.path.join(sInput, "*.docx")))
+        else:
+            lFiles = sorted(glob.glob(sInput))
+        # Word keeps lock files (~$name.docx) next to opened documents
+        lFiles = [sFile for sFile in lFiles if not os.path.basename(sFile).startswith("~$")]
+        if len(lFiles) == 0:
+            errHandle.Status("No input files found for '{}'".format(sInput))
+            return False
+
+        # The output is a directory
+        if not os.path.isdir(sOutDir):
+            os.makedirs(sOutDir)
+        lJobs = []
+        for sFile in lFiles:
+            sOutput = os.path.join(sOutDir, os.path.basename(sFile))
+            if os.path.abspath(sOutput) == os.path.abspath(sFile):
+                errHandle.Status("Output directory must differ from the input directory")
+                return False
+            lJobs.append((sFile, sOutput))
+
+        # Each worker makes its own error object and converters
+        oWorker = {k: v for k, v in options.items() if k != 'oerr'}
+
+        errHandle.Status("Converting {} files with {} workers".format(len(lJobs), iWorkers))
+        fStart = time.time()
+        lFailed = []
+        with multiprocessing.Pool(iWorkers, initializer=init_worker, initargs=(oWorker,)) as pool:
+            for sFile, bOkay, fTime in pool.imap_unordered(convert_one, lJobs):
+                if bOkay:
+                    errHandle.Status("  ok     {:.2f}s  {}".format(fTime, sFile))
+                else:
+                    errHandle.Status("  FAILED {:.2f}s  {}".format(fTime, sFile))
+                    lFailed.append(sFile)
+
+        # Give a summary
+        errHandle.Status("Converted {} of {} files in {:.2f}s".format(
+            len(lJobs) - len(lFailed), len(lJobs), time.time() - fStart))
+        for sFile in lFailed:
+            errHandle.Status("  failed: {}".format(sFile))
+
+        return len(lFailed) == 0
+    except:
+        errHandle.DoError("convert_batch")
+        return False
+
+
 # ----------------------------------------------------------------------------------
 # Goal :  If user calls this as main, then follow up on it
 # ----------------------------------------------------------------------------------
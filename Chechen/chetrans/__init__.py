@@ -0,0 +1,14 @@
+"""
+Transliteration of Chechen
+
+All rule profiles (handbook, flex, ipa, phonemic, cyrillic) compile into the
+same ConvertEngine. The tables behind the profiles are declarative files in
+tables/ (see loader.py). Typical use:
+
+    from chetrans import do_convert
+    sPhon = do_convert("Shwa cwa k'ant vu", dict(profile="flex", switches=["cc"]))
+"""
+
+from chetrans.rules import get_rules, profiles
+from chetrans.loader import load_table
+from chetrans.engine import ConvertEngine, get_engine, do_convert, do_convert_batch
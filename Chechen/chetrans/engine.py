@@ -0,0 +1,75 @@
+# ----------------------------------------------------------------------------------
+# Name :    engine
+# Goal :    The compiled conversion engine shared by all rule profiles
+# History:
+# 18/oct/2026    ERK Created
+# ----------------------------------------------------------------------------------
+
+import re
+from chetrans.rules import get_rules
+
+
+class ConvertEngine(object):
+    """Compiled form of an ordered list of rewrite stages
+
+    Each stage rewrites the whole string at once: the regular expressions are compiled
+    here, the literal stages are done by str.replace(). The text is not split into
+    words, so a context such as the end of the string (\\Z) means the end of the
+    string that is passed in."""
+
+    def __init__(self, lRules, **kwargs):
+        self.stages = []
+        for sFind, sReplace, bRegex in lRules:
+            if bRegex:
+                self.stages.append((re.compile(sFind).sub, sReplace))
+            else:
+                self.stages.append((None, (sFind, sReplace)))
+        return super(ConvertEngine, self).__init__(**kwargs)
+
+    def convert(self, sPart):
+        """Convert the string [sPart] by applying all stages in order"""
+
+        for sub, oReplace in self.stages:
+            if sub is None:
+                sPart = sPart.replace(*oReplace)
+            else:
+                sPart = sub(oReplace, sPart)
+        return sPart
+
+
+# One compiled engine per profile and combination of switches
+engines = {}
+
+def get_engine(switches, profile="handbook"):
+    """Get the (cached) compiled engine of [profile] for this combination of switches"""
+
+    key = (profile, frozenset(switches))
+    engine = engines.get(key)
+    if engine is None:
+        engine = ConvertEngine(get_rules(key[1], profile))
+        engines[key] = engine
+    return engine
+
+
+def get_options(options):
+    """Get the switches and the profile from [options]"""
+
+    if options is None: options = {}
+    return options.get('switches', []), options.get('profile', "handbook")
+
+
+def do_convert(sPart, options=None):
+    """Convert the string in [sPart] according to the profile in [options] (default: the Caucasian handbook)"""
+
+    # Let the compiled engine for these switches do the conversion
+    switches, profile = get_options(options)
+    return get_engine(switches, profile).convert(sPart)
+
+
+def do_convert_batch(parts, options=None):
+    """Convert all strings in [parts] with one set of [options], returning a list in the same order"""
+
+    # Resolve the compiled engine only once
+    switches, profile = get_options(options)
+    convert = get_engine(switches, profile).convert
+    return [convert(sPart) for sPart in parts]
@@ -0,0 +1,107 @@
+# ----------------------------------------------------------------------------------
+# Name :    loader
+# Goal :    Load the rule tables from their declarative files, with a compiled cache
+# History:
+# 18/oct/2026    ERK Created
+# ----------------------------------------------------------------------------------
+
+import os
+import csv
+import json
+import pickle
+import hashlib
+import tempfile
+
+# The rule tables live in this directory: <name>.tsv, <name>.json or <name>.toml
+table_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tables")
+# The compiled tables are kept next to them, like the .pyc files of Python
+cache_dir = os.path.join(table_dir, "__pycache__")
+# Raise this when the compiled form changes, so that older cache files are not used
+cache_version = 1
+
+
+def get_table_file(sName):
+    """Find the file that holds the rule table [sName]"""
+
+    for sExt in [".tsv", ".json", ".toml"]:
+        sFile = os.path.join(table_dir, sName + sExt)
+        if os.path.isfile(sFile):
+            return sFile
+    raise ValueError("There is no rule table called: {}".format(sName))
+
+
+def read_table(sFile):
+    """Read the rule table in [sFile] as a list of dictionaries
+
+    A .tsv file has a header line with the column names; empty cells are left out,
+    as are lines starting with '#'. A .json file holds the list itself, and a .toml
+    file holds it as an array of tables called [rule]."""
+
+    sExt = os.path.splitext(sFile)[1]
+    if sExt == ".json":
+        with open(sFile, "r", encoding="utf-8") as fp:
+            return json.load(fp)
+    if sExt == ".toml":
+        import tomllib
+        with open(sFile, "rb") as fp:
+            return tomllib.load(fp).get("rule", [])
+    with open(sFile, "r", encoding="utf-8", newline="") as fp:
+        lines = [sLine for sLine in fp if not sLine.startswith("#") and sLine.strip() != ""]
+    lBack = []
+    for row in csv.DictReader(lines, delimiter="\t", quoting=csv.QUOTE_NONE):
+        lBack.append({k: v for k, v in row.items() if v != "" and v is not None})
+    return lBack
+
+
+def load_table(sName, compile_table=None):
+    """Get rule table [sName], passed through [compile_table] (if given)
+
+    The compiled result is pickled, under the name of the compiler and the hash of
+    the source file. Later runs only read this pickle, until the source changes."""
+
+    sFile = get_table_file(sName)
+    with open(sFile, "rb") as fp:
+        oHash = hashlib.sha1(fp.read())
+    sCompiler = "" if compile_table is None else compile_table.__module__ + "." + compile_table.__name__
+    oHash.update("{}|{}".format(cache_version, sCompiler).encode("utf-8"))
+    # Each compiler of a table has its own cache files
+    sPrefix = "{}.{}.".format(sName, sCompiler.replace(".", "_") or "raw")
+    sCache = os.path.join(cache_dir, "{}{}.pickle".format(sPrefix, oHash.hexdigest()[:16]))
+
+    # Try the compiled form first
+    if os.path.isfile(sCache):
+        try:
+            with open(sCache, "rb") as fp:
+                return pickle.load(fp)
+        except Exception:
+            # A damaged cache is simply made again
+            pass
+
+    oTable = read_table(sFile)
+    if compile_table is not None:
+        oTable = compile_table(oTable)
+    sTemp = None
+    try:
+        bData = pickle.dumps(oTable, pickle.HIGHEST_PROTOCOL)
+        os.makedirs(cache_dir, exist_ok=True)
+        # Remove the cache files of earlier versions of this table and compiler
+        for sOld in os.listdir(cache_dir):
+            sOld = os.path.join(cache_dir, sOld)
+            if os.path.basename(sOld).startswith(sPrefix) and sOld.endswith(".pickle") and sOld != sCache:
+                try:
+                    os.remove(sOld)
+                except OSError:
+                    # Another process may have removed it already
+                    pass
+        # Worker processes may all do this at the same time: each writes its own
+        #   temporary file, and the replace of the cache itself is atomic
+        iHandle, sTemp = tempfile.mkstemp(dir=cache_dir, prefix=sPrefix, suffix=".tmp")
+        with os.fdopen(iHandle, "wb") as fp:
+            fp.write(bData)
+        os.replace(sTemp, sCache)
+    except Exception:
+        # The cache is an optimization only: a read-only location (or a table
+        #   that can not be pickled) is no problem
+        if sTemp is not None and os.path.exists(sTemp):
+            os.remove(sTemp)
+    return oTable
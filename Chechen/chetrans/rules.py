@@ -0,0 +1,181 @@
+# ----------------------------------------------------------------------------------
+# Name :    rules
+# Goal :    The rule profiles for the transliteration of Chechen
+# History:
+# 18/dec/2017    ERK Created (as part of convert.py)
+# 18/oct/2026    ERK Moved into the chetrans package; named profiles
+# 18/oct/2026    ERK Tables are read from the files in tables/
+# ----------------------------------------------------------------------------------
+
+import re
+from chetrans.loader import load_table
+
+# The conversion rules are applied as an ordered list of rewrite stages.
+#   Each stage is a tuple of three elements:
+# 1: the string (or regular expression) to be found
+# 2: the replacement (for a regular expression this may also be a function)
+# 3: True if (1) is a regular expression, False if it is a literal string
+# Since the stages work on each other's output, they can not simply be merged into
+#   one table. A literal stage is the fastest: str.replace() scans the text in C,
+#   so the handbook rules only use regular expressions where a literal can not do.
+
+
+def get_handbook_rules(switches):
+    """Turn the list of [switches] into the ordered stages for the Caucasian handbook"""
+
+    bGeminateV = ('vv' in switches)
+    bGeminateC = ('cc' in switches)
+    bIngush = ('ingush' in switches)
+    bHw = ('hw' in switches)
+    bGh = ('gh' in switches)
+    bIpa = ('ipa' in switches)
+    bFlex = ('flex' in switches)
+
+    # The long variant is either a doubled letter or the length mark
+    sLong = "" if bGeminateC else "ː"
+    lRules = []
+
+    # Treat the 'w' where it is a hw occurring after: c, ch, k, p, sh, s, t
+    #   (the letter before the 'w' is not changed, so one literal per letter will do)
+    for sCons in ["ch", "sh", "c", "k", "p", "s", "t"]:
+        lRules.append((sCons + "w", sCons + "ħ", False))
+    # Treat 'ww'
+    lRules.append(("ww", "ʕʕ" if bGeminateC else "ʕː", False))
+    if not bGh:
+        # Convert gh > ʁ (long and short variant)
+        lRules.extend([("ggh", "ʁː", False), ("gh", "ʁ", False), ("Gh", "ʁ", False)])
+    # Convert ch > č, zh > ž, sh > š (long and short variant)
+    for sLat, sPhon in [("c", "č"), ("z", "ž"), ("s", "š")]:
+        lRules.append((sLat + sLat + "h", sPhon + (sLong or sPhon), False))
+        lRules.append((sLat + "h", sPhon, False))
+        lRules.append((sLat.upper() + "h", sPhon, False))
+    if not bHw:
+        # Convert hw > ħ (long and short variant)
+        lRules.extend([("hhw", "ħ" + (sLong or "ħ"), False), ("hw", "ħ", False), ("Hw", "ħ", False)])
+    if bFlex:
+        # The FLEX interlinear uses the IPA letters for g and x
+        lRules.extend([("g", "ɡ", False), ("x", "χ", False)])
+    # Treat the 'w' where it occurs in other places
+    lRules.extend([("W", "ʕ", False), ("w", "ʕ", False)])
+    # Treat double glottal stop
+    lRules.append(("''", "ʔ" + (sLong or "ʔ"), False))
+    lRules.append(("’’", "ʔ" + (sLong or "ʔ"), False))
+    # Treat single glottal stop
+    for sVowel in "aeiuoy":
+        lRules.extend([(sVowel + "'", sVowel + "ʔ", False), (sVowel + "’", sVowel + "ʔ", False)])
+    # Treat [rh]
+    lRules.append(("rh", "r̥", False))
+
+    # The [v] does NOT change!!!
+
+    # Make sure that ejectives have the correct apostrophe
+    lRules.append(("'", "’", False))
+    # Long vowels
+    sVowels = "y" if bGeminateV else "aeiouy"
+    for sVowel in sVowels:
+        if sVowel == "y":
+            if bIngush: continue
+            sPhon = "ü"
+        else:
+            sPhon = sVowel
+        lRules.append((sVowel.upper() + sVowel, sPhon + "ː", False))
+        lRules.append((sVowel + sVowel, sPhon + "ː", False))
+    # Diphthong: the former regular expressions (e.g. "Ye(?:^[aeiouy])") could never
+    #   match, since the '^' can not occur halfway a string. They are left out.
+
+    # SHort vowels
+    if not bIngush:
+        lRules.extend([("Y", "ü", False), ("y", "ü", False)])
+    # Long consonants
+    if not bGeminateC:
+        for sCons in "bdghklmnpqrstvxz":
+            lRules.append((sCons + sCons, sCons + "ː", False))
+
+    # Should we do IPA?
+    if bIpa:
+        lRules.extend([("ü", "y", False), ("š", "ʃ", False), ("ž", "ʒ", False),
+                       ("č", "ʧ", False), ("c", "ʦ", False)])
+
+    # Return the ordered list of stages
+    return lRules
+
+
+def get_flex_rules(switches):
+    """The handbook stages, with the IPA letters for g and x that FLEX uses"""
+
+    return get_handbook_rules(set(switches) | {"flex"})
+
+
+def get_ipa_rules(switches):
+    """The handbook stages, ending in IPA letters"""
+
+    return get_handbook_rules(set(switches) | {"ipa"})
+
+
+def compile_table(lst_trans):
+    """Compile a first-match table (see tables/phonemic.tsv) into one regular expression
+
+    An alternation tries its options in the order of the list, so the first entry
+    that fits wins, just as when the table is walked letter by letter. The result is
+    the pattern and the dictionary of replacements."""
+
+    lOptions = []
+    dicPhon = {}
+    for oTrans in lst_trans:
+        sLatin = oTrans['latin']
+        sOption = re.escape(sLatin)
+        foll_context = oTrans.get("following")
+        if foll_context is not None:
+            # The following context: one of the letters, or the end ('#') of the string
+            #   that is converted; the engine does not split that string into words
+            sLetters = "".join(re.escape(ch) for ch in foll_context if ch != "#")
+            lAfter = ["[" + sLetters + "]"] if sLetters != "" else []
+            if "#" in foll_context:
+                lAfter.append(r"\Z")
+            sOption += "(?=" + "|".join(lAfter) + ")"
+        lOptions.append(sOption)
+        dicPhon.setdefault(sLatin, oTrans['phoneme'])
+    return "|".join(lOptions), dicPhon
+
+
+def get_phonemic_rules(switches):
+    """The letter-by-letter phonemic table of the FLEX project: the word is lower-cased first
+
+    A '#' in the table is the end of the whole string, as in the old convert_word():
+    in "ev-dwa" the 'v' is not at the end."""
+
+    sPattern, dicPhon = load_table("phonemic", compile_table)
+    lRules = []
+    lRules.append((r".+", lambda m: m.group(0).lower(), True))
+    lRules.append((sPattern, lambda m: dicPhon[m.group(0)], True))
+    return lRules
+
+
+def get_cyrillic_rules(switches):
+    """Latin to Cyrillic; switches 'macron' and 'full' select the vowel and diphthong options"""
+
+    # The syllable-based conversion of latcyr works on whole words
+    from latcyr import TranslitChe
+
+    oTranslit = TranslitChe()
+    oTranslit.set_options(dict(vowel="macron" if 'macron' in switches else "",
+                               diphthong="full" if 'full' in switches else ""))
+    return [(TranslitChe.re_word.pattern, lambda m: oTranslit.convert_word(m.group(0)), True)]
+
+
+# The named profiles: each one turns a list of switches into stages
+profiles = {
+    "handbook": get_handbook_rules,
+    "flex": get_flex_rules,
+    "ipa": get_ipa_rules,
+    "phonemic": get_phonemic_rules,
+    "cyrillic": get_cyrillic_rules
+    }
+
+
+def get_rules(switches, profile="handbook"):
+    """Get the ordered list of stages of [profile] for this list of [switches]"""
+
+    if not profile in profiles:
+        raise ValueError("Unknown transliteration profile: {}".format(profile))
+    return profiles[profile](switches)
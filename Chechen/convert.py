@@ -6,10 +6,17 @@
 # ----------------------------------------------------------------------------------
 
 import util
-import re
 import copy
 from docx import Document
+from docx.enum.style import WD_STYLE_TYPE
+from docx.oxml.ns import qn
+from docx.shared import Emu
 from latcyr import TranslitChe
+# The rules and the compiled engine are shared with the other projects
+from chetrans import get_engine, do_convert, do_convert_batch
+from sidecar import get_sidecar
+
+tag_tcPr = qn("w:tcPr")
 
 
 def academic2phonemic(options):
@@ -39,16 +46,56 @@ def academic2phonemic(options):
         sInput = options['input']
         sOutput = options['output']
 
-        # Initialize a transliterate object
-        translit = TranslitChe()
+        # Initialize a transliterate object (unless the caller already made one)
+        translit = options.get('translit')
+        if translit is None:
+            translit = TranslitChe()
+
+        # Possibly re-use the conversions of an earlier run from the sidecar cache
+        oCache = get_sidecar(options)
+        if oCache is not None and oCache.skip(options):
+            oErr.Status("Nothing changed, skipping: {}".format(sOutput))
+            return True
+
+        def convert_phon(sText):
+            if oCache is None:
+                return do_convert(sText, options)
+            return oCache.get("phon", sText, lambda s: do_convert(s, options))
+
+        def convert_cyr(sText):
+            if oCache is None:
+                return translit.do_lat2cyr(sText, options)
+            return oCache.get("cyr", sText, lambda s: translit.do_lat2cyr(s, options))
+
+        def convert_phon_batch(lTexts):
+            if oCache is None:
+                return do_convert_batch(lTexts, options)
+            return [convert_phon(sText) for sText in lTexts]
+
+        def convert_cyr_batch(lTexts):
+            if oCache is None:
+                return translit.do_lat2cyr_batch(lTexts, options)
+            return [convert_cyr(sText) for sText in lTexts]
 
         # Create a document object
         doc = Document(sInput)
         # Get the styles in the document
         styles = doc.styles
+        # Resolve the style table once: styleId to name, and the watched styles as a set of IDs
+        dicStyleNames = {}
+        dicStyles = {}
+        for style in styles:
+            dicStyleNames[style.style_id] = style.name
+            dicStyles[style.name] = style
+        watched = frozenset(sId for sId, sName in dicStyleNames.items() if sName in lStyles)
+        # Paragraphs and runs without a style of their own have the default style
+        par_default = get_style_id(styles.default(WD_STYLE_TYPE.PARAGRAPH))
+        run_default = get_style_id(styles.default(WD_STYLE_TYPE.CHARACTER))
         # Get target style
-        target = next((item for item in styles if item.name == sTarget), None )
-        target_cyrillic = next((item for item in styles if item.name == sTargetCyrillic), None )
+        target = dicStyles.get(sTarget)
+        target_cyrillic = dicStyles.get(sTargetCyrillic)
+        target_id = None if target is None else get_style_id(target, run_default)
+        target_cyrillic_id = None if target_cyrillic is None else get_style_id(target_cyrillic, run_default)
         
         iPar = 0
         # Walk through all the paragraphs of the document
@@ -56,136 +103,116 @@ def academic2phonemic(options):
         for par in doc.paragraphs:
             iPar += 1
             # Show where we are
-            oErr.Status("  paragraph #{}".format(iPar), True)
+            oErr.Progress("paragraphs", iPar)
             # Check paragraph
-            if par.style.name in lStyles:
-                oErr.Status("Convert par within document")
+            if (par._p.style or par_default) in watched:
+                oErr.Verbose("Convert par within document")
                 # Convert this part
-                t = do_convert(par.text, options)
+                t = convert_phon(par.text)
                 if add == "cyrillic":
-                    t_c = translit.do_lat2cyr(par.text, options)
+                    t_c = convert_cyr(par.text)
                     t = t + "\n" + t_c
                 # Replace it
                 par.text = t
-                x = par.style
             if len(par.runs) > 0:
                 old_runs = copy.copy(par.runs)
                 par.clear()
                 for run in old_runs:
-                    s = run.style.name
-                    if s in lStyles:
+                    sId = run._r.style
+                    if (sId or run_default) in watched:
                         # Convert this part
-                        t = do_convert(run.text, options)
-                        if add == "cyrillic":
-                            t_c = translit.do_lat2cyr(run.text, options)
-                            # t = t_c + "\n" + t
-                        # Replace it
-                        run.text = t
-                        # if needed change style name
-                        if target:
-                            run.style = target
+                        t = convert_phon(run.text)
                         if add == "cyrillic":
+                            t_c = convert_cyr(run.text)
                             # Create a new run
-                            par.add_run(t_c + "\n" , target_cyrillic)
+                            add_run(par, t_c + "\n", target_cyrillic_id)
                         # Simply add the run in the targt style
-                        par.add_run(run.text, target)
+                        add_run(par, t, target_id)
                     else:
-                        par.add_run(run.text, run.style)
+                        add_run(par, run.text, sId)
+
+        oErr.Progress("paragraphs", iPar, True)
 
-        # Next visit all TABLES in the document
+        # Next visit all TABLES in the document: first collect what is to be converted
         iTbl = 0
+        iCells = 0
         table_list = []
+        setCells = set()    # The <w:tc> elements that have been visited
+        lConvert = []       # Paragraphs and runs in a watched style
+        lRuns = []          # The runs among them
         oErr.Status("Walking tables...")
         for tbl in doc.tables:
             iTbl += 1
             # Show where we are
-            oErr.Status("  table #{}".format(iTbl), True)
-
-            # Find out how many columns there are
-
+            oErr.Verbose("  table #{}".format(iTbl), True)
 
-            # Visit all rows
-            iRow = 0
+            # Visit all rows and then all the cells in each row
             for row in tbl.rows:
-                iRow += 1
-                iCel = 0
-                lstCells = []
-                # And then all the cells in this row
                 for cell in row.cells:
-                    # Check if the cell is already there
-                    if not cell in lstCells:
-                        lstCells.append(cell)
-                        iCel += 1
-                        iPar = 0
-                        # Check the paragraphs in this cell
-                        for par in cell.paragraphs:
-                            iPar += 1
-                            if par.style.name in lStyles:
-                                oErr.Status("Convert par within table-cell")
-                                # Convert this part
-                                t = do_convert(par.text, options)
-                                if add == "cyrillic":
-                                    t_c = translit.do_lat2cyr(par.text, options)
-                                    t = t + "\n" + t_c
-                                # Replace it
-                                par.text = t
+                    # Merged cells occur more than once: only visit each <w:tc> once
+                    if cell._tc in setCells:
+                        continue
+                    setCells.add(cell._tc)
+                    iCells += 1
+                    oErr.Progress("cells", iCells)
+                    # Check the paragraphs in this cell
+                    for par in cell.paragraphs:
+                        if (par._p.style or par_default) in watched:
+                            oErr.Verbose("Convert par within table-cell")
+                            lConvert.append(par)
+                        else:
                             for run in par.runs:
-                                s = run.style.name
-                                if s in lStyles:
-                                    # Convert this part
-                                    t = do_convert(run.text, options)
-                                    if add == "cyrillic":
-                                        t_c = translit.do_lat2cyr(par.text, options)
-                                        t = t + "\n" + t_c
-                                    # Replace it
-                                    run.text = t
-                                    # if needed change style name
-                                    if target:
-                                        run.style = target
+                                if (run._r.style or run_default) in watched:
+                                    lConvert.append(run)
+                                    lRuns.append(run)
 
             # If we have the interlinearisation option set, then we need to perform that conversion
             if bInterlinear and len(tbl.columns) == 2:
                 table_list.append(tbl)
 
-        # Now treat the first table
-        if len(table_list) > 0:
-            # Take the first table
-            tbl = table_list[0]
+        oErr.Progress("cells", iCells, True)
 
-            # Yes, interlinearisation: Walk the source
-            num_gloss = 0       # Characters in the gloss-line
-            num_morph = 0       # Characters in the morph-line
-            tblNew = None
+        # Convert the texts of all cells as one batch, and write them back in one pass
+        lTexts = [oItem.text for oItem in lConvert]
+        lPhon = convert_phon_batch(lTexts)
+        if add == "cyrillic":
+            lPhon = [t + "\n" + t_c for t, t_c in zip(lPhon, convert_cyr_batch(lTexts))]
+        for oItem, t in zip(lConvert, lPhon):
+            oItem.text = t
+        if target is not None:
+            # The converted runs get the target style
+            for run in lRuns:
+                run._r.style = target_id
+
+        # Re-flow each two-column (interlinear) table into tables of at most [max_chars_per_row] per line
+        for tbl in table_list:
+            # Get the gloss and morph cell of each row, and their widths
+            lCells = []
+            lWidths = []
             for row in tbl.rows:
-                # Get the cells
-                cell_gloss = row.cells[0]
-                cell_morph = row.cells[1]
-                # Get text content
-                txt_gloss = cell_gloss.text
-                txt_morph = cell_morph.text
-                # Check counts
-                if num_gloss + len(txt_gloss) > max_chars_per_row or num_morph + len(txt_morph) > max_chars_per_row or tblNew == None:
-                    # Create a new table with two rows and zero columns
-                    tblNew = doc.add_table(2,0)
-                    tblNew.autofit = True
-                    oErr.Status("Added table. THe total tables = {}".format(len(doc.tables)))
-                    num_gloss = 0       # Characters in the gloss-line
-                    num_morph = 0       # Characters in the morph-line
-                # Add a column to the existing [tblNew]
-                colNew = tblNew.add_column(10)
-                # Copy cells
-                copy_table_cell(oErr, cell_gloss, colNew.cells[0])
-                copy_table_cell(oErr, cell_morph, colNew.cells[1])
-                # Adapt sizes
-                num_gloss += len(txt_gloss)
-                num_morph += len(txt_morph)
+                cells = row.cells
+                lCells.append((cells[0], cells[1]))
+                lWidths.append((len(cells[0].text), len(cells[1].text)))
+            # Plan the lines first, and then make each table in one go with all its columns
+            for lLine in plan_lines(lWidths, max_chars_per_row):
+                tblNew = doc._body.add_table(2, len(lLine), Emu(10 * len(lLine)))
+                tblNew.autofit = True
+                oErr.Verbose("Added table. THe total tables = {}".format(len(doc.tables)))
+                cells_gloss = tblNew.rows[0].cells
+                cells_morph = tblNew.rows[1].cells
+                for iCol, idx in enumerate(lLine):
+                    cell_gloss, cell_morph = lCells[idx]
+                    copy_table_cell(oErr, cell_gloss, cells_gloss[iCol])
+                    copy_table_cell(oErr, cell_morph, cells_morph[iCol])
 
             # Remove the original table
             # doc.tables.remove(tbl)
 
-
         # Save the document under the new name
         doc.save(sOutput)
+        if oCache is not None:
+            oCache.save()
+            oErr.Status("Cache: {} re-used, {} converted".format(oCache.hits, oCache.misses))
 
         # Return okay
         return True
@@ -193,19 +220,37 @@ def academic2phonemic(options):
         oErr.DoError("academic2phonemic")
         return False
 
+def get_style_id(style, sDefault=None):
+    """Get the raw styleId of [style]; the default style [sDefault] has none"""
+
+    if style is None or style.style_id == sDefault:
+        return None
+    return style.style_id
+
+
+def add_run(par, sText, sStyleId):
+    """Add a run to [par] with the raw style ID [sStyleId] (if any), without creating style objects"""
+
+    run = par.add_run(sText)
+    if sStyleId is not None:
+        run._r.style = sStyleId
+    return run
+
+
 def copy_table_cell(oErr, cell_src, cell_dst):
-    """Copy the contents of a table cell from source to destination"""
+    """Copy the contents of a table cell from source to destination, replacing what is there"""
 
     try:
-        # Check the paragraphs in this cell
-        for par in cell_src.paragraphs:
-            # Add a paragraph to the destination
-            par_dst = cell_dst.add_paragraph(text=par.text)
-            # Copy the runs of this paragraph
-            for run in par.runs:
-                s = run.style.name
-                run_dst = par_dst.add_run(run.text)
-                run_dst.style = run.style
+        tc_src = cell_src._tc
+        tc_dst = cell_dst._tc
+        # Keep only the cell properties of the destination
+        for child in list(tc_dst):
+            if child.tag != tag_tcPr:
+                tc_dst.remove(child)
+        # Copy the paragraphs (and anything else) of the source as they are
+        for child in tc_src:
+            if child.tag != tag_tcPr:
+                tc_dst.append(copy.deepcopy(child))
         # Return positively
         return True
     except:
@@ -213,121 +258,20 @@ def copy_table_cell(oErr, cell_src, cell_dst):
         return False
 
 
-def do_convert(sPart, options=None):
-    """Convert the string in [sPart] according to the rules for the Caucasian handbook"""
-
-    # Get the list of switches
-    switches = [] if not 'switches' in options else options['switches']
-    bGeminateV = ('vv' in switches)
-    bGeminateC = ('cc' in switches)
-    bIngush = ('ingush' in switches)
-    bHw = ('hw' in switches)
-    bGh = ('gh' in switches)
-    bIpa = ('ipa' in switches)
-    bOld = False
-
-    # Treat the 'w' where it is a hw occurring after: c, ch, k, p, sh, s, t
-    sPart = re.sub(r"(ch|c|k|p|sh|s|t)w", r"\g<1>ħ",sPart)
-
-    if bGeminateC:
-        # Treat 'ww'
-        sPart = sPart.replace("ww", "ʕʕ")
-        if not bGh:
-            # Convert gh > ʁ (long and short variant)
-            sPart = sPart.replace("ggh", "ʁː").replace("gh", "ʁ").replace("Gh", "ʁ")
-        # Convert ch > č (long and short variant)
-        sPart = sPart.replace("cch", "čč").replace("ch", "č").replace("Ch", "č")
-        # Convert zh > ž (long and short variant)
-        sPart = sPart.replace("zzh", "žž").replace("zh", "ž").replace("Zh", "ž")
-        # Convert sh > š (long and short variant)
-        sPart = sPart.replace("ssh", "šš").replace("sh", "š").replace("Sh", "š")
-        if not bHw:
-            # Convert hw > ħ (long and short variant)
-            sPart = sPart.replace("hhw", "ħħ").replace("hw", "ħ").replace("Hw", "ħ")
-    else:
-        # Treat 'ww'
-        sPart = sPart.replace("ww", "ʕː")
-        if not bGh:
-            # Convert gh > ʁ (long and short variant)
-            sPart = sPart.replace("ggh", "ʁː").replace("gh", "ʁ").replace("Gh", "ʁ")
-        # Convert ch > č (long and short variant)
-        sPart = sPart.replace("cch", "čː").replace("ch", "č").replace("Ch", "č")
-        # Convert zh > ž (long and short variant)
-        sPart = sPart.replace("zzh", "žː").replace("zh", "ž").replace("Zh", "ž")
-        # Convert sh > š (long and short variant)
-        sPart = sPart.replace("ssh", "šː").replace("sh", "š").replace("Sh", "š")
-        if not bHw:
-            # Convert hw > ħ (long and short variant)
-            sPart = sPart.replace("hhw", "ħː").replace("hw", "ħ").replace("Hw", "ħ")
-    # Treat the 'w' where it occurs in other places
-    sPart = re.sub(r"[Ww]", r"ʕ",sPart)
-    # Treat double glottal stop
-    if bGeminateC:
-        sPart = sPart.replace("''", "ʔʔ")
-        sPart = sPart.replace("’’", "ʔʔ")
-    else:
-        sPart = sPart.replace("''", "ʔː")
-        sPart = sPart.replace("’’", "ʔː")
-    # Treat single glottal stop
-    sPart = re.sub(r"([aeiuoy])(['’])", r"\g<1>ʔ", sPart)
-    # Treat [rh]
-    sPart = sPart.replace("rh", "r̥")
-
-    # The [v] does NOT change!!!
-    
-    # Make sure that ejectives have the correct apostrophe
-    sPart = sPart.replace("'", "’")
-    if bGeminateV:
-        if not bIngush:
-            sPart = sPart.replace("Yy", "üː").replace("yy", "üː")
-    else:
-        # Long vowels
-        sPart = sPart.replace("Aa", "aː").replace("aa", "aː")
-        sPart = sPart.replace("Ee", "eː").replace("ee", "eː")
-        sPart = sPart.replace("Ii", "iː").replace("ii", "iː")
-        sPart = sPart.replace("Oo", "oː").replace("oo", "oː")
-        sPart = sPart.replace("Uu", "uː").replace("uu", "uː")
-        if not bIngush:
-            sPart = sPart.replace("Yy", "üː").replace("yy", "üː")
-    # Diphthong
-    if bOld:
-        sPart = sPart.replace("Ye", "üe").replace("ye", "üe")
-        sPart = sPart.replace("Oe", "üe").replace("oe", "üe")   # So /ye/ and /oe/ coincide
-        sPart = sPart.replace("Ov", "ou").replace("ov", "ou")
-        sPart = sPart.replace("Ev", "eü").replace("ev", "eü")
-        sPart = sPart.replace("Av", "au").replace("av", "au")
-    else:
-        sPart = re.sub(r"Ye(?:^[aeiouy])", r"üe", sPart)
-        sPart = re.sub(r"Oe(?:^[aeiouy])", r"üe", sPart)
-        sPart = re.sub(r"Ov(?:^[aeiouy])", r"ou", sPart)
-        sPart = re.sub(r"Ev(?:^[aeiouy])", r"eü", sPart)
-        sPart = re.sub(r"Av(?:^[aeiouy])", r"au", sPart)
-        sPart = re.sub(r"ye(?:^[aeiouy])", r"üe", sPart)
-        sPart = re.sub(r"oe(?:^[aeiouy])", r"üe", sPart)
-        sPart = re.sub(r"ov(?:^[aeiouy])", r"ou", sPart)
-        sPart = re.sub(r"ev(?:^[aeiouy])", r"eü", sPart)
-        sPart = re.sub(r"av(?:^[aeiouy])", r"au", sPart)
-        pass
-    # SHort vowels
-    if not bIngush:
-        sPart = sPart.replace("Y", "ü").replace("y", "ü")
-    # Long consonants
-    if not bGeminateC:
-        sPart = sPart.replace("bb", "bː").replace("dd", "dː").replace("gg", "gː")
-        sPart = sPart.replace("hh", "hː").replace("kk", "kː").replace("ll", "lː")
-        sPart = sPart.replace("mm", "mː").replace("nn", "nː").replace("pp", "pː")
-        sPart = sPart.replace("qq", "qː").replace("rr", "rː").replace("ss", "sː")
-        sPart = sPart.replace("tt", "tː").replace("vv", "vː").replace("xx", "xː")
-        sPart = sPart.replace("zz", "zː")
-
-    # Should we do IPA?
-    if bIpa:
-        sPart = sPart.replace("ü", "y")
-        sPart = sPart.replace("š", "ʃ")
-        sPart = sPart.replace("ž", "ʒ")
-        sPart = sPart.replace("č", "ʧ")
-        sPart = sPart.replace("c", "ʦ")
-
-    # Return what we have made of it
-    return sPart
- 
\ No newline at end of file
+def plan_lines(lWidths, max_chars):
+    """Divide columns over lines of at most [max_chars] characters, filling each line greedily
+
+    Each item of [lWidths] holds the widths of one column on each of its lines (e.g. gloss
+    and morph). A column that is wider than [max_chars] by itself gets a line of its own.
+    The result is a list of lines, each a list of column indices."""
+
+    lLines = []
+    lTotal = None
+    for idx, tWidth in enumerate(lWidths):
+        if lTotal is None or any(iTotal + iWidth > max_chars for iTotal, iWidth in zip(lTotal, tWidth)):
+            # Start a new line
+            lLines.append([])
+            lTotal = [0] * len(tWidth)
+        lLines[-1].append(idx)
+        lTotal = [iTotal + iWidth for iTotal, iWidth in zip(lTotal, tWidth)]
+    return lLines
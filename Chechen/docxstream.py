@@ -0,0 +1,340 @@
+# ----------------------------------------------------------------------------------
+# Name :    docxstream
+# Goal :    Convert a .docx at the level of its OOXML stream (without python-docx)
+# History:
+# 18/oct/2026    ERK Created
+# ----------------------------------------------------------------------------------
+
+import os
+import re
+import copy
+import zipfile
+from lxml import etree
+from chetrans import get_engine
+from latcyr import TranslitChe
+from sidecar import get_sidecar
+
+# Namespaces and the (pre-qualified) tags we need
+w_ns = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+xml_space = "{http://www.w3.org/XML/1998/namespace}space"
+tag_body = "{%s}body" % w_ns
+tag_p = "{%s}p" % w_ns
+tag_pPr = "{%s}pPr" % w_ns
+tag_pStyle = "{%s}pStyle" % w_ns
+tag_r = "{%s}r" % w_ns
+tag_rPr = "{%s}rPr" % w_ns
+tag_rStyle = "{%s}rStyle" % w_ns
+tag_t = "{%s}t" % w_ns
+tag_tc = "{%s}tc" % w_ns
+tag_br = "{%s}br" % w_ns
+tag_cr = "{%s}cr" % w_ns
+tag_tab = "{%s}tab" % w_ns
+tag_ptab = "{%s}ptab" % w_ns
+tag_noBreakHyphen = "{%s}noBreakHyphen" % w_ns
+tag_hyperlink = "{%s}hyperlink" % w_ns
+tag_style = "{%s}style" % w_ns
+tag_name = "{%s}name" % w_ns
+attr_val = "{%s}val" % w_ns
+attr_styleId = "{%s}styleId" % w_ns
+attr_type = "{%s}type" % w_ns
+attr_default = "{%s}default" % w_ns
+
+part_document = "word/document.xml"
+part_styles = "word/styles.xml"
+
+# The built-in styles that Word shows under another name than in styles.xml (the
+#   same list as the BabelFish of python-docx, so that both engines use one name)
+style_aliases = {"caption": "Caption", "footer": "Footer", "header": "Header",
+                 "heading 1": "Heading 1", "heading 2": "Heading 2", "heading 3": "Heading 3",
+                 "heading 4": "Heading 4", "heading 5": "Heading 5", "heading 6": "Heading 6",
+                 "heading 7": "Heading 7", "heading 8": "Heading 8", "heading 9": "Heading 9"}
+
+
+def read_style_ids(zin):
+    """Read the styles part of the .docx
+
+    The result is a dictionary of style name to styleId, and one of style type
+    ('paragraph', 'character') to the styleId of the default style of that type."""
+
+    dicStyles = {}
+    dicDefaults = {}
+    if part_styles in zin.namelist():
+        with zin.open(part_styles) as fIn:
+            for event, style in etree.iterparse(fIn, tag=tag_style):
+                name = style.find(tag_name)
+                if name is not None:
+                    sName = name.get(attr_val)
+                    dicStyles[style_aliases.get(sName, sName)] = style.get(attr_styleId)
+                if style.get(attr_default) in ("1", "true", "on"):
+                    # As in Word (and python-docx), the last default of a type counts
+                    dicDefaults[style.get(attr_type)] = style.get(attr_styleId)
+                style.clear()
+    return dicStyles, dicDefaults
+
+
+class StreamConverter(object):
+    """Rewrite the paragraphs and runs of a document.xml stream
+
+    The text and the styles come out as in convert.py. The one difference: all other
+    run properties (bold, font, language...) are kept here, while convert.py rebuilds
+    each paragraph outside tables from plain runs with only their character style."""
+
+    def __init__(self, options, dicStyles, dicDefaults, cache=None, **kwargs):
+        self.options = options
+        self.oErr = options['oerr']
+        # The styles to watch as a set of style IDs
+        self.watched = frozenset(dicStyles[sName] for sName in options['styles'] if sName in dicStyles)
+        # Paragraphs and runs without a style of their own have the default style
+        self.par_default = dicDefaults.get("paragraph")
+        self.run_default = dicDefaults.get("character")
+        # The default character style is the same as no style at all
+        self.target = get_style_id(dicStyles.get(options.get('target')), self.run_default)
+        self.target_cyrillic = get_style_id(dicStyles.get(options.get('target_cyrillic')), self.run_default)
+        self.cyrillic = (options.get('add') == "cyrillic")
+        self.engine = get_engine(options.get('switches', []))
+        self.translit = options.get('translit')
+        if self.translit is None:
+            self.translit = TranslitChe()
+        self.translit.set_options(options)
+        # The sidecar cache of an earlier run (if any)
+        self.cache = cache
+        self.runs = 0
+        self.elements = 0
+        return super(StreamConverter, self).__init__(**kwargs)
+
+    def convert_phon(self, sText):
+        if self.cache is None:
+            return self.engine.convert(sText)
+        return self.cache.get("phon", sText, self.engine.convert)
+
+    def convert_cyr(self, sText):
+        if self.cache is None:
+            return "".join(self.translit.lat2cyr_chunks(sText))
+        return self.cache.get("cyr", sText, lambda s: "".join(self.translit.lat2cyr_chunks(s)))
+
+    def make_run(self, sText, rPr, sStyle):
+        """Make a new <w:r> with text [sText], based on [rPr] in style [sStyle]"""
+
+        run = etree.Element(tag_r)
+        if rPr is not None:
+            rPr = copy.deepcopy(rPr)
+            run.append(rPr)
+            set_run_style(rPr, sStyle)
+        elif sStyle is not None:
+            set_run_style(etree.SubElement(run, tag_rPr), sStyle)
+        append_text(run, sText)
+        return run
+
+    def rewrite_par(self, par, bCell=False):
+        """Convert one paragraph <w:p>; [bCell] is True for a paragraph in a table cell"""
+
+        pStyle = par.find(tag_pPr + "/" + tag_pStyle)
+        if (self.par_default if pStyle is None else pStyle.get(attr_val)) in self.watched:
+            # Convert the whole text of the paragraph into one new run
+            sText = get_par_text(par)
+            sBack = self.convert_phon(sText)
+            if self.cyrillic:
+                sBack = sBack + "\n" + self.convert_cyr(sText)
+            for child in list(par):
+                if child.tag != tag_pPr:
+                    par.remove(child)
+            par.append(self.make_run(sBack, None, None))
+            self.runs += 1
+            return
+
+        # Only look at the runs directly below the paragraph
+        for run in par.iterchildren(tag_r):
+            rStyle = run.find(tag_rPr + "/" + tag_rStyle)
+            if not (self.run_default if rStyle is None else rStyle.get(attr_val)) in self.watched:
+                continue
+            if self.cyrillic:
+                sCyr = self.convert_cyr(get_run_text(run))
+            for t in run.iterchildren(tag_t):
+                t.text = self.convert_phon(t.text or "")
+                t.set(xml_space, "preserve")
+            rPr = run.find(tag_rPr)
+            if self.cyrillic and bCell:
+                # Within a table cell the cyrillic goes on a new line of the same run (as in convert.py)
+                append_text(run, "\n" + sCyr)
+            elif self.cyrillic:
+                # The cyrillic goes into a run of its own before the converted one
+                run.addprevious(self.make_run(sCyr + "\n", rPr, self.target_cyrillic))
+            if self.target is not None:
+                if rPr is None:
+                    # A run in the default style may have no properties yet
+                    rPr = etree.Element(tag_rPr)
+                    run.insert(0, rPr)
+                set_run_style(rPr, self.target)
+            elif not bCell and rPr is not None:
+                # Outside tables convert.py gives the converted run no style without a target
+                set_run_style(rPr, None)
+            self.runs += 1
+
+    def rewrite(self, fIn, fOut):
+        """Stream document.xml from [fIn] to [fOut], rewriting one top-level element at a time"""
+
+        shell_root = None   # Empty copy of <w:document>, declaring the namespaces
+        shell_body = None   # Empty copy of <w:body> within [shell_root]
+        iDepth = 0
+        fOut.write(b"<?xml version='1.0' encoding='UTF-8' standalone='yes'?>\r\n")
+        for event, elem in etree.iterparse(fIn, events=("start", "end"), huge_tree=True):
+            if event == "start":
+                if iDepth == 0:
+                    shell_root = etree.Element(elem.tag, dict(elem.attrib), nsmap=elem.nsmap)
+                    root_head, root_tail = get_wrapper(shell_root, shell_root)
+                    fOut.write(root_head)
+                elif iDepth == 1 and elem.tag == tag_body:
+                    shell_body = etree.SubElement(shell_root, elem.tag, dict(elem.attrib))
+                    body_head, body_tail = get_wrapper(shell_root, shell_body)
+                    fOut.write(body_head[len(root_head):])
+                iDepth += 1
+                continue
+            iDepth -= 1
+            if iDepth == 0:
+                fOut.write(root_tail)
+            elif iDepth == 1 and elem.tag == tag_body:
+                fOut.write(body_tail[:len(body_tail)-len(root_tail)])
+                shell_root.remove(shell_body)
+            elif iDepth == 1 or (iDepth == 2 and elem.getparent().tag == tag_body):
+                # A complete top-level element: paragraph, table, section properties...
+                self.elements += 1
+                self.oErr.Progress("elements", self.elements)
+                if elem.tag == tag_p:
+                    self.rewrite_par(elem)
+                else:
+                    for par in elem.iter(tag_p):
+                        self.rewrite_par(par, next(par.iterancestors(tag_tc), None) is not None)
+                # Move the element into the shell, so that it does not declare all namespaces again
+                if iDepth == 1:
+                    shell, head, tail = shell_root, root_head, root_tail
+                else:
+                    shell, head, tail = shell_body, body_head, body_tail
+                shell.append(elem)
+                fOut.write(etree.tostring(shell_root, encoding="UTF-8", xml_declaration=False)[len(head):-len(tail)])
+                # Free what has been written
+                shell.remove(elem)
+
+
+def get_run_text(run):
+    """Get the text of <w:r> [run] as python-docx does: tabs and line breaks are included"""
+
+    lText = []
+    for child in run:
+        if child.tag == tag_t:
+            lText.append(child.text or "")
+        elif child.tag in (tag_tab, tag_ptab):
+            lText.append("\t")
+        elif child.tag == tag_br:
+            # Page and column breaks have no text
+            if child.get(attr_type, "textWrapping") == "textWrapping":
+                lText.append("\n")
+        elif child.tag == tag_cr:
+            lText.append("\n")
+        elif child.tag == tag_noBreakHyphen:
+            lText.append("-")
+    return "".join(lText)
+
+
+def get_par_text(par):
+    """Get the text of <w:p> [par] as python-docx does: its runs, also those of hyperlinks"""
+
+    lText = []
+    for child in par:
+        if child.tag == tag_r:
+            lText.append(get_run_text(child))
+        elif child.tag == tag_hyperlink:
+            lText.extend(get_run_text(run) for run in child.iterchildren(tag_r))
+    return "".join(lText)
+
+
+def append_text(run, sText):
+    """Append [sText] to <w:r> [run] as python-docx does: a tab becomes <w:tab/>, a new line <w:br/>"""
+
+    for sPart in re.split(r"([\t\r\n])", sText):
+        if sPart == "\t":
+            etree.SubElement(run, tag_tab)
+        elif sPart in ("\r", "\n"):
+            etree.SubElement(run, tag_br)
+        elif sPart != "":
+            t = etree.SubElement(run, tag_t)
+            t.set(xml_space, "preserve")
+            t.text = sPart
+
+
+def get_wrapper(shell_root, shell):
+    """Get the serialized text before and after the contents of [shell] within [shell_root]"""
+
+    shell.text = "\u2063"
+    sHead, sTail = etree.tostring(shell_root, encoding="UTF-8", xml_declaration=False).split(shell.text.encode("utf-8"))
+    shell.text = None
+    return sHead, sTail
+
+
+def get_style_id(sStyleId, sDefault):
+    """Get the styleId [sStyleId], or None if it is the default style [sDefault]"""
+
+    return None if sStyleId == sDefault else sStyleId
+
+
+def set_run_style(rPr, sStyle):
+    """Set (or remove, if [sStyle] is None) the <w:rStyle> of run properties [rPr]"""
+
+    rStyle = rPr.find(tag_rStyle)
+    if sStyle is None:
+        if rStyle is not None:
+            rPr.remove(rStyle)
+    else:
+        if rStyle is None:
+            # The run style must be the first of the run properties
+            rStyle = etree.Element(tag_rStyle)
+            rPr.insert(0, rStyle)
+        rStyle.set(attr_val, sStyle)
+
+
+def academic2phonemic_stream(options):
+    """Convert the file in options by rewriting the OOXML stream of document.xml
+
+    Only document.xml is rewritten; all other parts of the .docx are copied as they are."""
+
+    # Validate
+    if not ('input' in options and 'output' in options):
+        return False
+    # Make sure we have an error object
+    oErr = options['oerr']
+
+    try:
+        sInput = options['input']
+        sOutput = options['output']
+        sTemp = sOutput + ".tmp"
+        if options.get('convert') in ("interlinear", "i"):
+            oErr.Status("The stream engine does not re-flow interlinear tables")
+
+        # Possibly re-use the conversions of an earlier run from the sidecar cache
+        oCache = get_sidecar(options)
+        if oCache is not None and oCache.skip(options):
+            oErr.Status("Nothing changed, skipping: {}".format(sOutput))
+            return True
+
+        with zipfile.ZipFile(sInput) as zin:
+            dicStyles, dicDefaults = read_style_ids(zin)
+            oConv = StreamConverter(options, dicStyles, dicDefaults, oCache)
+            with zipfile.ZipFile(sTemp, "w", zipfile.ZIP_DEFLATED) as zout:
+                for info in zin.infolist():
+                    if info.filename == part_document:
+                        with zin.open(info) as fIn, zout.open(info, "w", force_zip64=True) as fOut:
+                            oConv.rewrite(fIn, fOut)
+                    else:
+                        # Copy anything else byte-for-byte
+                        zout.writestr(info, zin.read(info))
+        os.replace(sTemp, sOutput)
+        oErr.Progress("elements", oConv.elements, True)
+        oErr.Status("Converted {} runs".format(oConv.runs))
+        if oCache is not None:
+            oCache.save()
+            oErr.Status("Cache: {} re-used, {} converted".format(oCache.hits, oCache.misses))
+
+        # Return okay
+        return True
+    except:
+        oErr.DoError("academic2phonemic_stream")
+        return False
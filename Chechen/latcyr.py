@@ -5,38 +5,9 @@ Erwin R. Komen - May 2021
 """
 import re
 import sys
+from collections import OrderedDict
+from chetrans.loader import load_table
 
-# This conversion list is orderd long-to-short and contains four elements per unit:
-# 1: full latin (lower case) to be recognized
-# 2: syllabls (V=vowel, C=consonant, D=diphthong, C#=end-of-syllable consonant)
-# 3: cyrillic translation
-# 4: cyrillic translation in *open* syllable (usually left blank)
-# 5: cyrillic translation: syllable-initial
-# 6: cyrillic translation: syllable-initial in *open* syllable
-lst_latin_c = [
-    "bw_CC_бІ", "b_C_б",
-    "cch'_CC_ччІ", "cCh'_CC_цчІ", "ch'_C_чІ", "chw_CC_чхь",
-    "cchw_CCC_ччхь","cch_CC_чч", "cCh_CC_цч", "ch_C_ч", "c'_C_цІ", "cw_CC_цхь", "c_C_ц",
-    "dw_CC_дІ", "d_C_д",
-    "f_C_ф",
-    "ggh_CC_ггІ", "gh_C_гІ", "g_C_г", 
-    "hhw_CC_ххь", "hw_C_хь", "hh_CC_ххІ", "h_C_хІ",
-    "j_C_й",
-    "kx_CC_кьх", "kk'_CC_ккІ", "k'_C_кІ", "k_C_к",
-    "lhw_CC_лхь", "lh_CC_лхІ", "l_C_л",
-    "mw_CC_мІ", "m_C_м",
-    "nw_CC_нІ", "n_C_н",
-    "p'_C_пІ", "pw_CC_пхь", "p_C_п",
-    "qq'_CC_ккъ", "qq_CC_ккх", "q'_C_къ", "q_C_кх",
-    "rhw_CC_рхь", "rrh_CC_ррхІ", "rhh_CCC_рххІ", "rh_C_рхІ", "r_C_р",
-    "shw_CC_шхь", "ssh_CC_шш", "sh_C_ш", "sw_CC_схь", "s_C_с", 
-    "tw_CC_тхь", "t'_C_тІ", "t_C_т",
-    "v_C_в",
-    "w_C_І",
-    "xhw_CC_хъхь", "xw_CC_хъхь", "x_C_х",
-    "zzh_CC_жж", "zhw_CC_жІ", "zw_CC_зхь", "zh_C_ж", "z_C_з",
-    "''_CC_ъ", "'_C_"
-    ]
 vowel_lat = "aeiouy"
 
 lat_upper = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
@@ -120,94 +91,148 @@ class ErrHandle:
         return " ".join(self.loc_errStack)
 
 
+# The conversion tables are in chetrans/tables: consonants (.tsv) and vowels (.json)
+# Each unit has a [lat] (lower case) to be recognized, its [syl] structure
+#   (V=vowel, C=consonant, D=diphthong) and these cyrillic renderings:
+# - cyr     = normal cyrillic rendering
+# - open    = open syllable with macron rendering
+# - j       = after syllable-starting 'j'
+# - open_j  = open j-starting syllable with macron rendering
+# - g       = after syllable-starting glottal stop
+# - open_g  = open glottal-stop-starting syllable with macron rendering
+# - dip     = diphthong rendering *only in open syllables*
+class TransItem(object):
+    """One unit of the compiled conversion table
+
+    Attributes that do not apply to a unit are None (see [lst_trans_vs])"""
+
+    __slots__ = ('lat', 'syl', 'cyr', 'open', 'j', 'open_j', 'g', 'open_g', 'dip')
+
+    def __init__(self, lat, syl, cyr, **kwargs):
+        self.lat = lat
+        self.syl = syl
+        self.cyr = cyr
+        for sKey in self.__slots__[3:]:
+            setattr(self, sKey, kwargs.pop(sKey, None))
+        return super(TransItem, self).__init__(**kwargs)
+
+
+def make_index(lst_items):
+    """Index the items on the first letter of their [lat], keeping the order of [lst_items]"""
+
+    dicIndex = {}
+    for item in lst_items:
+        dicIndex.setdefault(item.lat[0], []).append((item.lat, item))
+    return {k: tuple(v) for k, v in dicIndex.items()}
+
+
+# Index consonants and vowels on their first letter, so that a lookup only visits the candidates
+def compile_items(lst_rows):
+    """Compile the rows of a conversion table into TransItems, indexed on their first letter
+
+    The result is a tuple: the rows themselves, the items and the index"""
+
+    items = tuple(TransItem(**dict({'cyr': ""}, **oRow)) for oRow in lst_rows)
+    return lst_rows, items, make_index(items)
+
+
+# Load the compiled tables: CONSONANTS from [cyrillic_consonants], vowels from [cyrillic_vowels]
+lst_latin_c, trans_c, index_c = load_table("cyrillic_consonants", compile_items)
+lst_trans_vs, trans_vs, index_vs = load_table("cyrillic_vowels", compile_items)
+
+
+class WordCache(object):
+    """Bounded LRU cache of converted words"""
+
+    def __init__(self, size=10000, **kwargs):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.words = OrderedDict()
+        return super(WordCache, self).__init__(**kwargs)
+
+    def get(self, key):
+        """Get the converted word for [key], or None if it is not (yet) in the cache"""
+
+        sBack = self.words.get(key)
+        if sBack is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.words.move_to_end(key)
+        return sBack
+
+    def put(self, key, sValue):
+        """Store the converted word for [key], dropping the least recently used one if needed"""
+
+        if self.size <= 0:
+            return
+        self.words[key] = sValue
+        if len(self.words) > self.size:
+            self.words.popitem(last=False)
+
+    def clear(self):
+        """Empty the cache and reset the counters"""
+
+        self.words.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def get_stats(self):
+        """Return the size, number of entries, hits and misses as a dictionary"""
+
+        return dict(size=self.size, entries=len(self.words), hits=self.hits, misses=self.misses)
+
+
 class TranslitChe(object):
     is_latin = re.compile(r"[a-zA-Z']")
-    lst_trans_c = []
-    lst_trans_v = []
+    re_word = re.compile(r"[a-zA-Z']+")
+    # The compiled tables are shared by all instances
+    lst_trans_c = trans_c
+    lst_trans_vs = trans_vs
     diphthongs_full = False
     vowels_macron = False
-    # All vowels...
-    # - cyr     = normal cyrillic rendering
-    # - open    = open syllable with macron rendering
-    # - j       = after syllable-starting 'j'
-    # - open_j  = open j-starting syllable with macron rendering
-    # - g       = after syllable-starting glottal stop
-    # - open_g  = open glottal-stop-starting syllable with macron rendering
-    # - dip     = diphthong rendering *only in open syllables*
-    lst_trans_vs = [
-        {'lat': 'aa', 'syl': 'VV', 'cyr': 'а',  'open': 'ā', 'j': 'я', 'open_j': 'я̄'},
-        {'lat': 'ae', 'syl': 'V',  'cyr': 'аь',              'j': 'яь'              },
-        {'lat': 'a',  'syl': 'V',  'cyr': 'а',               'j': 'я'               },
-        {'lat': 'ee', 'syl': 'VV', 'cyr': 'е',  'open': 'ē', 'g': 'э', 'open_g': 'э̄'},
-        {'lat': 'eE', 'syl': 'VV', 'cyr': 'ē',               'g': 'э̄'               },
-        {'lat': 'e',  'syl': 'V',  'cyr': 'е',               'g': 'э'               },
-        {'lat': 'ie', 'syl': 'D',  'cyr': 'е',  'dip': 'иэ', 'g': 'э'               },
-        {'lat': 'ii', 'syl': 'VV', 'cyr': 'ий'                                      },
-        {'lat': 'i',  'syl': 'V',  'cyr': 'и'                                       },
-        {'lat': 'oo', 'syl': 'VV', 'cyr': 'о',  'open': 'ō'                         },
-        {'lat': 'oe', 'syl': 'D',  'cyr': 'оь'                                      },
-        {'lat': 'o',  'syl': 'V',  'cyr': 'о'                                       },
-        {'lat': 'uo', 'syl': 'D',  'cyr': 'о',  'dip': 'уо'                         },
-        {'lat': 'uu', 'syl': 'VV', 'cyr': 'у',  'open': 'ȳ', 'j': 'ю', 'open_j': 'ю̄'},
-        {'lat': 'u',  'syl': 'V',  'cyr': 'у',               'j': 'ю'               },
-        {'lat': 'yy', 'syl': 'VV', 'cyr': 'уьй',             'j': 'юьй'             },
-        {'lat': 'ye', 'syl': 'D',  'cyr': 'оь'                                      },
-        {'lat': 'y',  'syl': 'V',  'cyr': 'уь',              'j': 'юь'              },
-        ]
     oErr = ErrHandle()
 
-    def __init__(self, **kwargs):
-        # Read the list of CONSONANTS into my own list
-        for item in lst_latin_c:
-            arItem = item.split("_")
-            oItem = dict(lat=arItem[0], syl=arItem[1], cyr=arItem[2])
-            self.lst_trans_c.append(oItem)
-
-        ## Read the list of skip vowels into my own list
-        #for item in lst_latin_vs:
-        #    arItem = item.split("_")
-        #    oItem = dict(lat=arItem[0], syl=arItem[1])
-        #    self.lst_trans_vs.append(oItem)
-
-        ## Read the list of VOWELS into my own list
-        #for item in lst_latin_v:
-        #    arItem = item.split("_")
-        #    oItem = dict(lat=arItem[0], syl=arItem[1], cyr=arItem[2],
-        #                 cyr_open=None, cyr_ini=None, cyr_ini_open=None)
-        #    num = len(arItem)
-        #    if num > 3:
-        #        oItem['cyr_open'] = arItem[3]
-        #    if num > 4:
-        #        oItem['cyr_ini'] = arItem[4]
-        #    if num > 5:
-        #        oItem['cyr_ini_open'] = arItem[5]
-        #    self.lst_trans_v.append(oItem)
-
+    def __init__(self, cache_size=10000, **kwargs):
+        # Each converter keeps its own cache of converted words
+        self.word_cache = WordCache(cache_size)
         # Make sure to also do what belongs to this object
         return super(TranslitChe, self).__init__(**kwargs)
 
+    def clear_cache(self):
+        """Empty the cache of converted words"""
+
+        self.word_cache.clear()
+
+    def convert_word(self, sWord):
+        """Convert ONE WORD, using the cache of words converted with the same options"""
+
+        key = (sWord, self.vowels_macron, self.diphthongs_full)
+        sBack = self.word_cache.get(key)
+        if sBack is None:
+            sBack = self.lat2cyr_word(sWord)
+            self.word_cache.put(key, sBack)
+        return sBack
+
     def lat2cyr_word(self, sWord):
         """Perform conversion latin to cyrillic on ONE WORD only"""
 
         def skip_vowel(jPos, sText):
-            for item in self.lst_trans_vs:
-                sLat = item['lat']
-                lenItem = len(sLat)
-                if sText[jPos:jPos+lenItem] == sLat:
+            for sLat, item in index_vs.get(sText[jPos], ()):
+                if sText.startswith(sLat, jPos):
                     # Found it!
-                    return jPos + lenItem, item
+                    return jPos + len(sLat), item
             # DIdn't find it
             return jPos, None
 
         def get_cons(jPos, sText):
             """Get one consonant (cluster)"""
 
-            for item in self.lst_trans_c:
-                sLat = item.get('lat')
-                lenItem = len(sLat)
-                if sText[jPos:jPos+lenItem] == sLat:
+            for sLat, item in index_c.get(sText[jPos], ()):
+                if sText.startswith(sLat, jPos):
                     # Found it!
-                    return jPos + lenItem, item
+                    return jPos + len(sLat), item
             # DIdn't find it
             return jPos, None
 
@@ -283,61 +308,61 @@ class TranslitChe(object):
             word_len = len(lWord)
             for idx, oLetter in enumerate(lWord):
                 # Make sure we have the complete environment
-                syl_this = oLetter['syl']
-                foll_env = "#" if idx >= word_len-1 else lWord[idx+1]['syl']
-                foll_foll_env = "#" if idx >= word_len-2 else lWord[idx+2]['syl']
+                syl_this = oLetter.syl
+                foll_env = "#" if idx >= word_len-1 else lWord[idx+1].syl
+                foll_foll_env = "#" if idx >= word_len-2 else lWord[idx+2].syl
 
                 # Determine the syllable type: open or closed
                 syl_type = get_syl_type(prec_env, syl_this, foll_env, foll_foll_env)
 
                 # Start with a simple case
-                if oLetter['syl'] in ['C', 'CC']:
+                if oLetter.syl in ['C', 'CC']:
                     # Just produce the cyrillic output
-                    lBack.append(oLetter['cyr'])
-                elif oLetter['syl'] == "D":
+                    lBack.append(oLetter.cyr)
+                elif oLetter.syl == "D":
                     # Diphthong...
-                    if self.diphthongs_full and 'dip' in oLetter and syl_type == "open":
-                        lBack.append(oLetter['dip'])
-                    elif 'g' in oLetter and get_g_start(prec_env, prec_letter):
-                        lBack.append(oLetter['g'])
+                    if self.diphthongs_full and oLetter.dip is not None and syl_type == "open":
+                        lBack.append(oLetter.dip)
+                    elif oLetter.g is not None and get_g_start(prec_env, prec_letter):
+                        lBack.append(oLetter.g)
                     else:
-                        lBack.append(oLetter['cyr'])
-                elif oLetter['syl'] == "V":
+                        lBack.append(oLetter.cyr)
+                elif oLetter.syl == "V":
                     # Short vowel...
-                    if prec_letter == "j" and 'j' in oLetter:
+                    if prec_letter == "j" and oLetter.j is not None:
                         # Replace with preceding variant
-                        lBack[-1] = oLetter['j']
-                    elif 'g' in oLetter and get_g_start(prec_env, prec_letter):
+                        lBack[-1] = oLetter.j
+                    elif oLetter.g is not None and get_g_start(prec_env, prec_letter):
                         # Use the glottal-start variant
-                        lBack.append(oLetter['g'])
+                        lBack.append(oLetter.g)
                     else:
-                        lBack.append(oLetter['cyr'])
-                elif oLetter['syl'] == "VV":
+                        lBack.append(oLetter.cyr)
+                elif oLetter.syl == "VV":
                     # Long vowel
-                    if self.vowels_macron and 'open' in oLetter and syl_type == "open":
-                        if prec_letter == "j" and 'open_j' in oLetter:
+                    if self.vowels_macron and oLetter.open is not None and syl_type == "open":
+                        if prec_letter == "j" and oLetter.open_j is not None:
                             # Replace with preceding variant
-                            lBack[-1] = oLetter['open_j']
-                        elif 'open_g' in oLetter and get_g_start(prec_env, prec_letter):
+                            lBack[-1] = oLetter.open_j
+                        elif oLetter.open_g is not None and get_g_start(prec_env, prec_letter):
                             # Use the glottal-start variant
-                            lBack.append(oLetter['open_g'])
+                            lBack.append(oLetter.open_g)
                         else:
-                            lBack.append(oLetter['open'])
-                    elif prec_letter == "j" and 'j' in oLetter:
+                            lBack.append(oLetter.open)
+                    elif prec_letter == "j" and oLetter.j is not None:
                         # Replace with preceding variant
-                        lBack[-1] = oLetter['j']
-                    elif 'g' in oLetter and get_g_start(prec_env, prec_letter):
+                        lBack[-1] = oLetter.j
+                    elif oLetter.g is not None and get_g_start(prec_env, prec_letter):
                         # Use the glottal-start variant
-                        lBack.append(oLetter['g'])
+                        lBack.append(oLetter.g)
                     else:
-                        lBack.append(oLetter['cyr'])
+                        lBack.append(oLetter.cyr)
                 else:
                     # Cannot happen
-                    self.oErr.Status("lat2cyr_word: unknown syllable type {}".format(oLetter['syl']))
+                    self.oErr.Status("lat2cyr_word: unknown syllable type {}".format(oLetter.syl))
 
                 # Adapt the prec_env (preceding environment) and the prec_letter (preceding letter)
                 prec_env = syl_this
-                prec_letter = oLetter['lat']
+                prec_letter = oLetter.lat
             # COmbine
             sBack = "".join(lBack)
             # Possibly apply capitalization
@@ -351,54 +376,39 @@ class TranslitChe(object):
 
         return sBack
    
-    def do_lat2cyr(self, sPart, options=None):
-        """COnvert latin in [sPart] to cyrillic"""
+    def set_options(self, options):
+        """Take over the conversion options from [options]"""
 
-        # Get the list of switches
-        switches = [] if not 'switches' in options else options['switches']
-        self.diphthongs_full = (options.get("diphthong") == "full") 
+        if options is None: options = {}
+        self.diphthongs_full = (options.get("diphthong") == "full")
         self.vowels_macron = (options.get("vowel") == "macron")
-        
-        # Initialize
-        bCons = True        # Start of word is with a consonant (if anything, then glottal stop by default)
-        iPos = 0            # Position of current Latin letter in word
-        iLen = len(sPart)   # Length of the Latin word
-        result = []         # The result is a list of objects, one for each phoneme
-        bWord = False
+
+    def iter_lat2cyr(self, sPart, options=None):
+        """Convert latin in [sPart] to cyrillic, yielding the converted chunks one by one"""
+
+        self.set_options(options)
+        return self.lat2cyr_chunks(sPart)
+
+    def lat2cyr_chunks(self, sPart):
+        """Yield the converted chunks of [sPart], using the options that have already been set"""
+
         iStart = 0
+        # Only the runs of latin letters are words: anything in between is kept as it is
+        for oMatch in self.re_word.finditer(sPart):
+            if oMatch.start() > iStart:
+                yield sPart[iStart:oMatch.start()]
+            yield self.convert_word(oMatch.group(0))
+            iStart = oMatch.end()
+        # Don't forget the last chunk
+        if iStart < len(sPart):
+            yield sPart[iStart:]
 
-        try:
+    def do_lat2cyr(self, sPart, options=None):
+        """COnvert latin in [sPart] to cyrillic"""
 
-            # Divide the string into words
-            while iPos < iLen:
-                # Are we starting a word or not?
-                sThis = sPart[iPos]
-                bThisWord = (self.is_latin.match(sThis) != None)
-                # Check where we are
-                if not bWord and bThisWord:
-                    # we were inside a non-word, but this is a word...
-                    sChunk = sPart[iStart:iPos]
-                    # (1) Add chunk to result
-                    result.append(sChunk)
-                    # (2) Reset counter
-                    iStart = iPos
-                elif bWord and not bThisWord:
-                    # we were in word, now in non-word
-                    sWord = sPart[iStart:iPos]
-                    # (1) Convert this word
-                    converted = self.lat2cyr_word(sWord)
-                    # (2) Add word to result
-                    result.append(converted)
-                    # (3) Reset counter
-                    iStart = iPos
-                # Make sure we adapt where we are
-                bWord = bThisWord
-
-                # Go to the next position
-                iPos += 1
+        try:
             # Re-combine everything
-            sPart = "".join(result)
-
+            sPart = "".join(self.iter_lat2cyr(sPart, options))
         except:
             msg = self.oErr.get_error_message()
             self.oErr.DoError("do_lat2cyr")
@@ -406,5 +416,20 @@ class TranslitChe(object):
         # Return the result
         return sPart
 
+    def do_lat2cyr_batch(self, parts, options=None):
+        """Convert all latin strings in [parts] to cyrillic, using one set of [options]
+
+        The result is a list of converted strings in the same order as [parts]"""
 
+        lBack = []
+        self.set_options(options)
+        for sPart in parts:
+            try:
+                sPart = "".join(self.lat2cyr_chunks(sPart))
+            except:
+                msg = self.oErr.get_error_message()
+                self.oErr.DoError("do_lat2cyr_batch")
+            lBack.append(sPart)
 
+        # Return the result
+        return lBack
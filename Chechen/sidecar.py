@@ -0,0 +1,103 @@
+# ----------------------------------------------------------------------------------
+# Name :    sidecar
+# Goal :    Re-use the conversions of an earlier run (for both conversion engines)
+# History:
+# 18/oct/2026    ERK Created (from convert.py)
+# ----------------------------------------------------------------------------------
+
+import os
+import json
+import hashlib
+from latcyr import lst_latin_c, lst_trans_vs
+from chetrans import get_rules
+
+
+def get_sidecar(options):
+    """Get the sidecar cache for options['update'] ('incremental' or 'skip'), or None"""
+
+    if not options.get('update') in ("incremental", "skip"):
+        return None
+    return SidecarCache(options.get('cache', options['output'] + ".cache.json"),
+                        get_fingerprint(options), get_file_hash(options['input']))
+
+
+class SidecarCache(object):
+    """Converted texts of an earlier run, stored next to the output file
+
+    Each text is stored under the hash of its kind and contents. The cache is only
+    valid for the options fingerprint it was made with."""
+
+    def __init__(self, sFile, sFingerprint, sInputHash, **kwargs):
+        self.file = sFile
+        self.fingerprint = sFingerprint
+        self.input_hash = sInputHash
+        self.old_input_hash = None
+        self.old = {}       # Conversions read from the sidecar file
+        self.new = {}       # Conversions used in this run
+        self.hits = 0
+        self.misses = 0
+        if os.path.exists(sFile):
+            try:
+                with open(sFile, "r", encoding="utf-8") as fp:
+                    oStored = json.load(fp)
+                if oStored.get('fingerprint') == sFingerprint:
+                    self.old = oStored.get('texts', {})
+                    self.old_input_hash = oStored.get('input')
+            except (ValueError, OSError):
+                # An unreadable cache is simply ignored
+                self.old = {}
+        return super(SidecarCache, self).__init__(**kwargs)
+
+    def is_unchanged(self):
+        """Check if the input file and the options are the same as in the earlier run"""
+
+        return self.old_input_hash == self.input_hash
+
+    def skip(self, options):
+        """Check if options['update'] is 'skip' and the output of the earlier run can stay as it is"""
+
+        return options.get('update') == "skip" and self.is_unchanged() and os.path.exists(options['output'])
+
+    def get(self, sKind, sText, convert):
+        """Get the conversion of [sText] from the cache, or [convert] it"""
+
+        sKey = hashlib.sha1((sKind + "\t" + sText).encode("utf-8")).hexdigest()
+        sBack = self.new.get(sKey)
+        if sBack is None:
+            sBack = self.old.get(sKey)
+            if sBack is None:
+                self.misses += 1
+                sBack = convert(sText)
+            else:
+                self.hits += 1
+            self.new[sKey] = sBack
+        else:
+            self.hits += 1
+        return sBack
+
+    def save(self):
+        """Write the conversions used in this run to the sidecar file"""
+
+        oStored = dict(fingerprint=self.fingerprint, input=self.input_hash, texts=self.new)
+        with open(self.file, "w", encoding="utf-8") as fp:
+            json.dump(oStored, fp, ensure_ascii=False)
+
+
+def get_fingerprint(options):
+    """Get a hash of all options (and the rules they lead to) that determine the conversion"""
+
+    switches = sorted(options.get('switches', []))
+    oPrint = dict(switches=switches, rules=get_rules(switches), cyrillic=[lst_latin_c, lst_trans_vs])
+    for sKey in ['styles', 'target', 'target_cyrillic', 'convert', 'add', 'vowel', 'diphthong', 'engine']:
+        oPrint[sKey] = options.get(sKey)
+    return hashlib.sha1(json.dumps(oPrint, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def get_file_hash(sFile):
+    """Get the hash of the contents of [sFile]"""
+
+    oHash = hashlib.sha1()
+    with open(sFile, "rb") as fp:
+        for chunk in iter(lambda: fp.read(1 << 20), b""):
+            oHash.update(chunk)
+    return oHash.hexdigest()
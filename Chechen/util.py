@@ -1,12 +1,25 @@
-import sys, traceback
+import sys, traceback, time
+
+# Log levels: quiet = errors only, summary = status and progress line, verbose = everything
+log_levels = {"quiet": 0, "summary": 1, "verbose": 2}
 
 class ErrHandle:
   """Error handling"""
 
+  # The progress line is updated at most once per [progress_interval] seconds
+  progress_interval = 0.2
+
   # ======================= CLASS INITIALIZER ========================================
-  def __init__(self):
+  def __init__(self, level="summary"):
     # Initialize a local error stack
     self.loc_errStack = []
+    self.set_level(level)
+    self.progress_start = None
+    self.progress_last = 0.0
+
+  def set_level(self, level):
+      """Set the log level: quiet, summary or verbose"""
+      self.level = log_levels.get(level, log_levels["summary"])
 
   # ----------------------------------------------------------------------------------
   # Name :    Status
@@ -15,6 +28,8 @@ class ErrHandle:
   # 6/apr/2016    ERK Created
   # ----------------------------------------------------------------------------------
   def Status(self, msg, bCr = False):
+      if self.level < log_levels["summary"]:
+          return
       if bCr:
           # Print the message with \r as end
           print(msg, file=sys.stderr, end='\r')
@@ -22,6 +37,39 @@ class ErrHandle:
           # Just print the message
           print(msg, file=sys.stderr)
 
+  # ----------------------------------------------------------------------------------
+  # Name :    Verbose
+  # Goal :    Give a status message that is only needed in verbose mode
+  # History:
+  # 18/oct/2026    ERK Created
+  # ----------------------------------------------------------------------------------
+  def Verbose(self, msg, bCr = False):
+      if self.level >= log_levels["verbose"]:
+          self.Status(msg, bCr)
+
+  # ----------------------------------------------------------------------------------
+  # Name :    Progress
+  # Goal :    Show one progress line with counts and throughput
+  # History:
+  # 18/oct/2026    ERK Created
+  # ----------------------------------------------------------------------------------
+  def Progress(self, sLabel, iCount, bFinal = False):
+      if self.level < log_levels["summary"]:
+          return
+      fNow = time.time()
+      if self.progress_start is None:
+          self.progress_start = fNow
+      # Only update the line every [progress_interval] seconds (and at the end)
+      if not bFinal and fNow - self.progress_last < self.progress_interval:
+          return
+      self.progress_last = fNow
+      fElapsed = max(fNow - self.progress_start, 0.001)
+      print("  {} {} ({:.0f}/s, {:.1f}s)".format(iCount, sLabel, iCount / fElapsed, fElapsed),
+            file=sys.stderr, end="\n" if bFinal else "\r")
+      if bFinal:
+          self.progress_start = None
+          self.progress_last = 0.0
+
   # ----------------------------------------------------------------------------------
   # Name :    DoError
   # Goal :    Process an error
@@ -3,9 +3,11 @@
 # Date:   January 2017
 # ==============================================================================
 
-# import regex library for searching verb endings and NLTK for tokenizing
+# import regex library for searching verb endings and tokenizing
 import re
-from nltk.tokenize import RegexpTokenizer
+import sys, os, io, glob, getopt
+import multiprocessing
+from collections import Counter
 
 # Store transliteration correspondences of Cyrillic : Latin characters.
 # Dict is easier to edit than if statements later.
@@ -38,6 +40,8 @@ digraphs = {"гъ": "ğ", "гь": "h", "къ": "g'", "кь": "q'", "кI": "k'",
 nonalphanum = ('"', ',', '-', '?', '!', ':', '.', '(', ')', '[', ']', ' ', '\n')
 # files with cyrillic orthography
 Cyr_files = ['Text1.txt']
+# also keep the transliterated text of each file in Latin_<file>
+write_latin = True
 # list of finite verbal inflection endings and full copula forms; transliterated
 Vendings = ["ray(ni)?(t’a)?\\b", "za?vay?(ç|çir)?(ni)?(t’a)?\\b",
     "zmay?(ç|çir)?(ni)?(t’a)?\\b", "mir(ni)?(t’a)?\\b",
@@ -56,114 +60,119 @@ Vendings = ["ray(ni)?(t’a)?\\b", "za?vay?(ç|çir)?(ni)?(t’a)?\\b",
     "\\bgalamay?(ç|çir)?(ni)?(t’a)?\\b",
     "\\bkumay?(ç|çir)?(ni)?(t’a)?\\b", "\\balamay?(ç|çir)?(ni)?(t’a)?\\b"]
     # non-finite endings - "z\\b", "daldi(ni)?(t’a)?\\b", "rdavay(ni)?(t’a)?\\b", "nmaz(di)?(ni)?(t’a)?\\b"
+# tokens are words only (no punctuation); the . ? and ! end a sentence
+word_pattern = re.compile(r'\w+')
+punct_pattern = re.compile('[.?!]')
+# compiled transliteration and verb regex of a worker process (see init_worker)
+worker = None
+
+# Compiles the transliteration dicts into one function that transliterates a line.
+# Digraphs are found by one regex (longest first), single chars by a translate table.
+# Chars that are in neither (and not in punct) are left out.
+def compile_translit(transliteration, digphs, punct):
+    # alternation of all digraphs, the longest first
+    keys = sorted(digphs, key=len, reverse=True)
+    digraph_pattern = re.compile('(' + '|'.join(re.escape(key) for key in keys) + ')')
+    # keep punctuation as it is, transliterate single Cyrillic chars
+    table = {ord(char): char for char in punct}
+    for char in transliteration:
+        table[ord(char)] = transliteration[char]
+    # anything else is skipped: "?", 2nd letters of digraphs, Latin characters, numerals
+    other_pattern = re.compile('[^' + ''.join(re.escape(chr(key)) for key in table) + ']+')
+
+    def convert_line(line):
+        # split() keeps the digraphs at the odd positions
+        parts = digraph_pattern.split(line)
+        for x in range(0, len(parts), 2):
+            parts[x] = other_pattern.sub('', parts[x]).translate(table)
+        for x in range(1, len(parts), 2):
+            parts[x] = digphs[parts[x]]
+        return ''.join(parts)
+
+    return convert_line
+
+# Streams the lines of a Cyrillic file through the transliteration.
+# Yields each Latin line; also writes them to latin_file if that is given
+def stream_latin(file, convert_line, latin_file=None):
+    with open(file, 'r', encoding='UTF8') as cyrFile:
+        if latin_file is None:
+            for line in cyrFile:
+                yield convert_line(line)
+        else:
+            # Create new file for Latin transliteration (re-runs start afresh)
+            with open(latin_file, 'w', encoding='UTF8') as latinFile:
+                for line in cyrFile:
+                    line = convert_line(line)
+                    latinFile.write(line)
+                    yield line
+
+# Latin_ file next to a Cyrillic file (also when the file is in a directory)
+def latin_name(file):
+    return os.path.join(os.path.dirname(file), 'Latin_' + os.path.basename(file))
 
 # Transliterates list of files.
 # Returns list of list of transliterated files
 def transliterate(files, transliteration, digphs, punct):
+    convert_line = compile_translit(transliteration, digphs, punct)
     # transliterated files
     lat_files = []
     for file in files:
-        # Get the absolute path
-        cyrFile = open(file, 'r', encoding='UTF8')
-        # Create new file for Latin transliteration
-        filename = 'Latin_' + file
-        latinFile = open (filename, 'a', encoding='UTF8')
-        # Readlines of Cyrillic file, put in list
-        lines = cyrFile.readlines()
-        #Look at each item in list of lines
-        for line in lines:
-            # keep track of index, declare string to combine two chars
-            max = len(line)
-            x = 0
-            combo = ''
-            # look at each char in each line
-            for i in line:
-                # first keep chars that are the same, increase index counter
-                if i in punct:
-                    latinFile.write(i)
-                    x+=1
-                # Combine i with next letter if i is not end of line
-                else:
-                    if x < max-1:
-                        j = line[x + 1]
-                        combo = i + j
-                    # if i and next letter == digraph key, append value
-                    if combo in digphs:
-                        latinFile.write(digphs[combo])
-                    # transliterate single Cyrillic chars
-                    elif i in transliteration:
-                        latinFile.write(transliteration[i])
-                    # skip character "?", 2nd letters of digraphs, Latin characters, or numerals and increase index count
-                    else:
-                        x += 1
-                        continue
-                    # increase index count
-                    x += 1
-        #Close new and old file
-        cyrFile.close()
-        latinFile.close()
+        filename = latin_name(file)
+        # Convert and write each line at once
+        for line in stream_latin(file, convert_line, filename):
+            pass
         #add Latin file to list
         lat_files.append(filename)
     return lat_files
 
+# Takes list of morphemes (regexes).
+# Returns one regex: group "verb" is the ending/aux, group "punct" a following . ? or !
+def compile_endings(endings):
+    # an ending that occurs twice in the list is only searched (and counted) once
+    unique = []
+    for ending in endings:
+        if ending not in unique:
+            unique.append(ending)
+    return re.compile('(?P<verb>' + '|'.join('(?:' + ending + ')' for ending in unique) + ')(?P<punct>[.?!])?')
+
 # Takes list of Latin files and list of morphemes
-# Returns dict with occurrences of each ending/aux
+# Returns dict with occurrences of each ending/aux, and dict with the sentence-final ones (key ends in . ? or !)
 def vCount(files, endings):
+    pattern = compile_endings(endings)
     #store endings with count
     verbs = {}
-    # loop thru Latin files
+    sent_fin = {}
+    # loop thru Latin files, one scan per file
     for file in files:
-        f = open(file, 'r', encoding='UTF8')
-        lines = f.readlines()
-        # search each line
-        for line in lines:
-            # for each ending/aux
-            for ending in endings:
-                # make it a regex
-                pattern = re.compile(ending)
-                # search for each ending
-                found = re.finditer(pattern, line)
-                if found:
-                    for find in found:
-                        item = find.group()
-                        if item not in verbs:
-                            #add to dict
-                            verbs[item] = 1
-                        else:
-                            #increase value
-                            verbs[item] += 1
-            f.close()
-    return verbs
-
-# Takes iterable of strings, adds . ? !.
-# Returns list of new strings
-def add_punct(endings):
-    li = []
-    for ending in endings:
-        # add punct and add 3 patterns to list
-        new_item = ending + '\.'
-        li.append(new_item)
-        new_item = ending + '\?'
-        li.append(new_item)
-        new_item = ending + '\!'
-        li.append(new_item)
-    return li
+        with open(file, 'r', encoding='UTF8') as f:
+            text = f.read()
+        for find in pattern.finditer(text):
+            item = find.group('verb')
+            verbs[item] = verbs.get(item, 0) + 1
+            # sentence final if followed by . ? or !
+            if find.group('punct'):
+                item += find.group('punct')
+                sent_fin[item] = sent_fin.get(item, 0) + 1
+    return verbs, sent_fin
 
 #Takes two dicts of endings, one with periods/commas, one without
-#Returns dict with occurrences of endings that are NOT sentence final (wo periods)
+#Returns dict with occurrences of endings that are NOT sentence final (wo periods):
+#every ending that occurs at least once without . ? or ! after it, as in post_verbal_elements.txt
 def nonFVCalculate(woPuncts, wPuncts):
-    # dict for count of non-sentence final occurrences
-    nonSentFinalCount = {}
+    # sentence final occurrences of each ending, for . ? and ! together
+    finalCount = {}
     for wPunct in wPuncts:
         #remove period from each key
         x = wPunct[:-1]
-        for woPunct in woPuncts:
-            # if ending in both dicts, subtract # of sentence final occurrences from total occurrences
-            if x == woPunct:
-                difference = woPuncts[woPunct] - wPuncts[wPunct]
-                # add to dict only if there is at least one non-sentencefinal occurrence
-                if difference > 0:
-                    nonSentFinalCount[x] = difference
+        finalCount[x] = finalCount.get(x, 0) + wPuncts[wPunct]
+    # dict for count of non-sentence final occurrences
+    nonSentFinalCount = {}
+    for woPunct in woPuncts:
+        # subtract # of sentence final occurrences from total occurrences
+        difference = woPuncts[woPunct] - finalCount.get(woPunct, 0)
+        # add to dict only if there is at least one non-sentencefinal occurrence
+        if difference > 0:
+            nonSentFinalCount[woPunct] = difference
     return nonSentFinalCount
 
 # Takes dict of verbs w counts as values.
@@ -176,69 +185,196 @@ def sum_values(dict):
         total += i
     return total
 
+# Takes one file, counts its tokens while reading it in large chunks.
+# Returns token count of the file
+def count_tokens(file, chunk_size=1 << 20):
+    wc = 0
+    # start of a token that may continue in the next chunk
+    carry = ''
+    with open(file, 'r', encoding='UTF8') as current:
+        while True:
+            chunk = current.read(chunk_size)
+            if chunk == '':
+                break
+            text = carry + chunk
+            tokens = word_pattern.findall(text)
+            carry = ''
+            # the last token runs up to the end of the chunk: count it with the next one
+            if len(tokens) > 0 and word_pattern.match(text, len(text) - 1):
+                carry = tokens.pop()
+            wc += len(tokens)
+    if carry != '':
+        wc += 1
+    return wc
+
 # Takes list of files, tokenizes each, and count tokens.
+# Only words are tokens, not punctuation (see word_pattern); files are counted by several processes.
 # Return total token count for corpus of files.
-def countwords(files):
-    # number of tokens in file
+def countwords(files, workers=None):
+    workers = min(workers or os.cpu_count() or 1, len(files))
+    # one process is just as fast without the pool
+    if workers <= 1:
+        return sum(count_tokens(file) for file in files)
+    with multiprocessing.Pool(workers) as pool:
+        return sum(pool.imap_unordered(count_tokens, files))
+
+# Takes one Cyrillic file, compiled transliteration and verb regex, and file object for the post-verbal elements.
+# Streams the file line by line and does all counting in that one pass, so only one line
+# (and the current sentence) is in memory at a time.
+# Writes the post-verbal elements of every verb that is not sentence-final to new,
+# and the Latin_ file only if write_latin is True.
+# Returns Counter of all verbs, Counter of sentence-final verbs (as vCount) and token count
+def analyse_file(file, convert_line, verb_pattern, new, write_latin=False):
+    verbs = Counter()
+    sent_fin = Counter()
     wc = 0
-    # Only allow words as tokens, not punctuation or numerals
-    tokenizer = RegexpTokenizer(r'\w+')
-    # count tokens in each file, add to total word count
-    for file in files:
-        current = open(file, 'r', encoding= 'UTF8')
-        lines = current.read()
-        tokens = tokenizer.tokenize(f)
-        wc += len(tokens)
-        current.close()
-    return wc
+    # Append name of file being searched separated by new lines
+    new.write('\n' + file + '\n\n')
+    latin_file = latin_name(file) if write_latin else None
+    # post-verbal elements that are still waiting for their . ? or !
+    pending = []
+    for line in stream_latin(file, convert_line, latin_file):
+        # tokens: only words, not punctuation
+        wc += len(word_pattern.findall(line))
+        # the sentence end (if any) closes the pending elements
+        end = punct_pattern.search(line)
+        for parts in pending:
+            parts.append(line if end is None else line[:end.start()])
+        if end is not None:
+            for parts in pending:
+                write_pve(new, ''.join(parts))
+            pending = []
+        for find in verb_pattern.finditer(line):
+            item = find.group('verb')
+            verbs[item] += 1
+            if find.group('punct'):
+                # sentence final: no post-verbal elements
+                sent_fin[item + find.group('punct')] += 1
+                continue
+            # post-verbal elements run up to the next . ? or !
+            end = punct_pattern.search(line, find.end())
+            if end is None:
+                pending.append([line[find.end():]])
+            else:
+                write_pve(new, line[find.end():end.start()])
+    # the end of the file closes the last sentence
+    for parts in pending:
+        write_pve(new, ''.join(parts))
+    return verbs, sent_fin, wc
+
+# Adds post-verbal element on new line in file if not empty string
+def write_pve(new, str_result):
+    if str_result != '':
+        new.write(str_result + '\n')
+
+# Takes list of Cyrillic files, the transliteration dicts and list of morphemes.
+# Analyses the files one after another (see analyse_file), post-verbal elements go to pve_file.
+# Returns dict of all verbs, dict of sentence-final verbs and total token count
+def process_corpus(files, transliteration, digphs, punct, endings, write_latin=False, pve_file='post_verbal_elements.txt'):
+    convert_line = compile_translit(transliteration, digphs, punct)
+    verb_pattern = compile_endings(endings)
+    verbs = Counter()
+    sent_fin = Counter()
+    wc = 0
+    with open(pve_file, 'w', encoding='UTF8') as new:
+        for file in files:
+            file_verbs, file_sent_fin, file_wc = analyse_file(file, convert_line, verb_pattern, new, write_latin)
+            verbs.update(file_verbs)
+            sent_fin.update(file_sent_fin)
+            wc += file_wc
+    return dict(verbs), dict(sent_fin), wc
+
+# Compiles the transliteration and the verb regex once for each worker process
+def init_worker(transliteration, digphs, punct, endings, write_latin):
+    global worker
+    worker = (compile_translit(transliteration, digphs, punct), compile_endings(endings), write_latin)
+
+# Analyses one file within a worker process (map step).
+# Returns file, its Counters and token count, and its post-verbal elements as text
+def analyse_one(file):
+    convert_line, verb_pattern, write_latin = worker
+    new = io.StringIO()
+    verbs, sent_fin, wc = analyse_file(file, convert_line, verb_pattern, new, write_latin)
+    return file, verbs, sent_fin, wc, new.getvalue()
+
+# Takes list of Cyrillic files etc. as process_corpus, and the number of worker processes.
+# Each worker analyses whole files; their Counters are added up at the end (reduce step).
+# Returns dict of all verbs, dict of sentence-final verbs and total token count
+def process_batch(files, transliteration, digphs, punct, endings, workers=None, write_latin=False, pve_file='post_verbal_elements.txt'):
+    workers = min(workers or os.cpu_count() or 1, len(files))
+    # one process is just as fast without the pool
+    if workers <= 1:
+        return process_corpus(files, transliteration, digphs, punct, endings, write_latin, pve_file)
+    verbs = Counter()
+    sent_fin = Counter()
+    wc = 0
+    with open(pve_file, 'w', encoding='UTF8') as new, \
+         multiprocessing.Pool(workers, initializer=init_worker, initargs=(transliteration, digphs, punct, endings, write_latin)) as pool:
+        # imap keeps the order of the files for the post-verbal elements
+        for file, file_verbs, file_sent_fin, file_wc, pves in pool.imap(analyse_one, files):
+            verbs.update(file_verbs)
+            sent_fin.update(file_sent_fin)
+            wc += file_wc
+            new.write(pves)
+    return dict(verbs), dict(sent_fin), wc
+
+# Takes a file, directory or glob pattern.
+# Returns sorted list of the Cyrillic .txt files in it (not the Latin_ output)
+def find_files(name):
+    if os.path.isdir(name):
+        name = os.path.join(name, '*.txt')
+    files = [file for file in glob.glob(name) if not os.path.basename(file).startswith('Latin_')]
+    return sorted(files)
+
+# Prints results of the analysis
+def report(verbs, sent_fin_Vs, wordCount):
+    totalV = sum_values(verbs)
+    totalSFV = sum_values(sent_fin_Vs)
+    nonFinal = nonFVCalculate(verbs, sent_fin_Vs)
+
+    print("All Verbs:", verbs)
+    print("Clause-final verbs:", sent_fin_Vs)
+    print("Total number of verbs in text:", totalV)
+    print("Total number of clause-final verbs:", totalSFV)
+    print("Total number of words:", wordCount)
+    print("Non-clause-final verbs:")
+    for x in nonFinal:
+        print(x,'\t',nonFinal[x])
+
+# Command line: Lezgi.py [-j workers] [-o pve_file] [-n] [file|directory|glob ...]
+# Without files Cyr_files is analysed; -n does not write the Latin_ files
+def main(prgName, argv):
+    syntax = prgName + ' [-j workers] [-o post_verbal_elements.txt] [-n] [file|directory|glob ...]'
+    try:
+        opts, args = getopt.getopt(argv, "hj:o:n", ["jobs=", "output=", "nolatin"])
+    except getopt.GetoptError:
+        print(syntax)
+        sys.exit(2)
+    workers = None
+    pve_file = 'post_verbal_elements.txt'
+    latin = write_latin
+    for opt, arg in opts:
+        if opt == '-h':
+            print(syntax)
+            sys.exit(0)
+        elif opt in ("-j", "--jobs"):
+            workers = int(arg)
+        elif opt in ("-o", "--output"):
+            pve_file = arg
+        elif opt in ("-n", "--nolatin"):
+            latin = False
+    files = Cyr_files
+    if len(args) > 0:
+        files = []
+        for arg in args:
+            files.extend(find_files(arg))
+    if len(files) == 0:
+        print("No input files found")
+        sys.exit(1)
+    # one pass over the corpus, which also makes the file of post-verbal elements
+    report(*process_batch(files, translit, digraphs, nonalphanum, Vendings, workers, latin, pve_file))
 
-#Takes list of morphemes and files, adds elements for regex searching, searches in file and adds results to file.
-#Adds list of verbs + post-verbal elements to new file
-def getPVE(files, verbs):
-    # create new file for results
-    new = open('post_verbal_elements.txt', 'a', encoding='UTF8')
-    # loop thru Latin files
-    for file in files:
-        # Append name of file being searched separated by new lines
-        marker = '\n' + file + '\n\n'
-        new.write(marker)
-        f = open(file, 'r', encoding='UTF8')
-        lines = f.read()
-        # for each ending/aux
-        for verb in verbs:
-            # change search pattern to get post verbal elements, up to next . ? or !
-            pat = re.compile(verb + '\\b' + '([^.?!]*)\.?\??!?')
-            # search for each ending
-            results = re.finditer(pat, lines)
-            if results:
-                for result in results:
-                    str_result = result.group(1)
-                    # Add search results on new line in file if not empty string
-                    if str_result != '':
-                        new.write(str_result + '\n')
-    new.close()
-
-
-#main program
-newFiles = transliterate(Cyr_files, translit, digraphs, nonalphanum)
-verbs = vCount(newFiles, Vendings)
-totalV = sum_values(verbs)
-last_verbs = add_punct(Vendings)
-sent_fin_Vs = vCount(newFiles, last_verbs)
-totalSFV = sum_values(sent_fin_Vs)
-nonFinal = nonFVCalculate(verbs, sent_fin_Vs)
-wordCount = countwords(newFiles)
-#turn nonFV verbs into list
-nonFmorph = nonFinal.keys()
-#file of post-verbal elements
-getPVE(newFiles, nonFmorph)
-
-print("All Verbs:", verbs)
-print("Clause-final verbs:", sent_fin_Vs)
-print("Total number of verbs in text:", totalV)
-print("Total number of non-clause-final verbs:", totalSFV)
-print("Total number of words:", wordCount)
-print("Non-clause-final verbs:")
-for x in nonFinal:
-    print(x,'\t',nonFinal[x])
 
+#main program (only when this is called as a script, so that the functions can be imported)
+if __name__ == "__main__":
+    main(sys.argv[0], sys.argv[1:])
@@ -10,63 +10,33 @@ Example:
                         -o "d:/data files/elpash/stories_phon.xml"
 """
 
-import sys, getopt, os.path, importlib
+import sys, getopt, os.path, importlib, time
 import re
 from lxml import etree
 
 
-trans_phonemic = [
-    {"latin": "ae", "phoneme": "æ"},
-    {"latin": "a", "phoneme": "a"},
-    {"latin": "b", "phoneme":  "b"},
-    {"latin": "ch'", "phoneme":  "ʧ’"},
-    {"latin": "chw", "phoneme":  "ʧħ"}, 
-    {"latin": "ch", "phoneme":  "ʧ"},
-    {"latin": "c'", "phoneme":  "ʦ’"},
-    {"latin": "cw", "phoneme":  "ʦħ"},
-    {"latin": "c", "phoneme":  "ʦ"},
-    {"latin": "d", "phoneme":  "d"},
-    {"latin": "ev", "phoneme":  "ey", "following": "#bcdghklmnpqrstwxz'"},  # context: / _#  or / _[cons]
-    {"latin": "e", "phoneme":  "e"},
-    {"latin": "gh", "phoneme":  "ʁ"},
-    {"latin": "g", "phoneme":  "g"},
-    {"latin": "hhw", "phoneme":  "ħħ"}, #
-    {"latin": "hw", "phoneme":  "ħ"}, #
-    {"latin": "h", "phoneme":  "h"},
-    {"latin": "i", "phoneme":  "i"},
-    {"latin": "j", "phoneme":  "j"},
-    {"latin": "k'", "phoneme":  "k’"},
-    {"latin": "k", "phoneme":  "k"},
-    {"latin": "l", "phoneme":  "l"},
-    {"latin": "m", "phoneme":  "m"},
-    {"latin": "n", "phoneme":  "n"},
-    {"latin": "ov", "phoneme":  "ou"},
-    {"latin": "o", "phoneme":  "o"},
-    {"latin": "p'", "phoneme":  "p’"},
-    {"latin": "pw", "phoneme":  "pħ"},
-    {"latin": "p", "phoneme":  "p"},
-    {"latin": "q'", "phoneme":  "q’"},
-    {"latin": "q", "phoneme":  "q"},
-    {"latin": "rh", "phoneme":  "r̥"},
-    {"latin": "r", "phoneme":  "r"},
-    {"latin": "shw", "phoneme":  "ʃħ"}, 
-    {"latin": "ssh", "phoneme":  "ʃʃ"},
-    {"latin": "sh", "phoneme":  "ʃ"},
-    {"latin": "sw", "phoneme":  "sħ"},  
-    {"latin": "s", "phoneme":  "s"},
-    {"latin": "t'", "phoneme":  "t’"},
-    {"latin": "tw", "phoneme":  "tħ"},  
-    {"latin": "t", "phoneme":  "t"},
-    {"latin": "u", "phoneme":  "u"},
-    {"latin": "v", "phoneme":  "v"},
-    {"latin": "w", "phoneme":  "ʕ"},
-    {"latin": "x", "phoneme":  "χ"},
-    {"latin": "zh", "phoneme":  "ʒ"},
-    {"latin": "z", "phoneme":  "z"},
-    {"latin": "'", "phoneme":  "ʔ"}
-    ]
+# The transliteration rules are shared with the Chechen project
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Chechen"))
+from chetrans import get_engine
 
 
+# Namespaces of the FLEX Word-XML export, and the pre-qualified tags we need
+namespaces = {'m': 'http://schemas.openxmlformats.org/officeDocument/2006/math',
+              'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
+tag_body = "{%s}body" % namespaces['w']
+tag_rPr = "{%s}rPr" % namespaces['w']
+tag_rStyle = "{%s}rStyle" % namespaces['w']
+attr_w_val = "{%s}val" % namespaces['w']
+tag_m_r = "{%s}r" % namespaces['m']
+tag_m_e = "{%s}e" % namespaces['m']
+tag_m_t = "{%s}t" % namespaces['m']
+tag_m_rSp = "{%s}rSp" % namespaces['m']
+tag_m_rPr = "{%s}rPr" % namespaces['m']
+tag_m_nor = "{%s}nor" % namespaces['m']
+attr_m_val = "{%s}val" % namespaces['m']
+# Glosses are split at these characters
+rBreak = re.compile(r'[\-\:\.]')
+
 
 # ================== General helper functions =============================
 def get_error_message():
@@ -79,10 +49,44 @@ def get_error_message():
     else:
         return ""
 
+# Log levels: quiet = errors only, summary = status and progress line, verbose = everything
+log_levels = {"quiet": 0, "summary": 1, "verbose": 2}
+log_level = log_levels["summary"]
+# The progress line is updated at most once per [progress_interval] seconds
+progress_interval = 0.2
+progress = {"start": None, "last": 0.0, "count": 0}
+
+def set_log_level(level):
+    global log_level
+    log_level = log_levels.get(level, log_levels["summary"])
+
 def Status( msg):
+    if log_level < log_levels["summary"]:
+        return
     # Just print the message
     print(msg, file=sys.stderr)
 
+def Verbose(msg):
+    if log_level >= log_levels["verbose"]:
+        print(msg, file=sys.stderr)
+
+def Progress(sLabel, iCount, bFinal = False):
+    """Show one progress line with counts and throughput, at most once per [progress_interval]"""
+    if log_level < log_levels["summary"]:
+        return
+    fNow = time.time()
+    if progress["start"] is None:
+        progress["start"] = fNow
+    if not bFinal and fNow - progress["last"] < progress_interval:
+        return
+    progress["last"] = fNow
+    fElapsed = max(fNow - progress["start"], 0.001)
+    print("  {} {} ({:.0f}/s, {:.1f}s)".format(iCount, sLabel, iCount / fElapsed, fElapsed),
+          file=sys.stderr, end="\n" if bFinal else "\r")
+    if bFinal:
+        progress["start"] = None
+        progress["last"] = 0.0
+
 def DoError(msg, bExit = False):
     # get the message
     sErr = get_error_message()
@@ -105,13 +109,14 @@ def main(prgName, argv) :
     flInput = ''        # input file name: XML with author definitions
     flOutput = ''       # output file name
     method = 'test1'    # Method used
+    bStream = False     # Stream the XML instead of loading it as a whole
 
     try:
-        sSyntax = prgName + ' -i <FLEX interlinear> -o <FLEX interlinear>'
+        sSyntax = prgName + ' [-s] [-l quiet|summary|verbose] -i <FLEX interlinear> -o <FLEX interlinear>'
         # get all the arguments
         try:
             # Get arguments and options
-            opts, args = getopt.getopt(argv, "hi:o:m:", ["-ifile=", "-ofile", "method"])
+            opts, args = getopt.getopt(argv, "hi:o:m:sl:", ["-ifile=", "-ofile", "method", "stream", "log="])
         except getopt.GetoptError:
             print(sSyntax)
             sys.exit(2)
@@ -126,6 +131,10 @@ def main(prgName, argv) :
                 flOutput = arg
             elif opt in ("-m", "--method"):
                 method = arg
+            elif opt in ("-s", "--stream"):
+                bStream = True
+            elif opt in ("-l", "--log"):
+                set_log_level(arg)
         # Check if all arguments are there
         if (flInput == '' or flOutput == ''):
             DoError(sSyntax)
@@ -135,7 +144,7 @@ def main(prgName, argv) :
         Status('Output is "' + flOutput + '"')
         Status('Method: "' + method + '"')
 
-        oArgs = dict(input=flInput, output=flOutput, method=method)
+        oArgs = dict(input=flInput, output=flOutput, method=method, stream=bStream)
 
         # Call the function that actually does the work
         if not interlinear2phonemic(oArgs):
@@ -159,9 +168,6 @@ def interlinear2phonemic(oArgs):
     flInput = ""
     flOutput = ""
     method = "test1"
-    rBreak =re.compile( r'[\-\:\.]')
-    namespaces = {'m': 'http://schemas.openxmlformats.org/officeDocument/2006/math',
-                  'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
     
     try:
         # Recover the arguments
@@ -169,68 +175,23 @@ def interlinear2phonemic(oArgs):
         if "output" in oArgs: flOutput = oArgs["output"]
         if "method" in oArgs: method = oArgs['method']
 
-        trans_phon = trans_phonemic
-
         # Check input file
         if not os.path.isfile(flInput):
             Status("Please specify an input FILE")
             return False
 
-        namespacestyle = 'xmlns:m="{}" xmlns:w="{}"'.format(namespaces['m'], namespaces['w'])
-        
+        # Large exports are better streamed from input to output
+        if oArgs.get("stream"):
+            return interlinear2phonemic_stream(oArgs)
+
         # Read the text file into an array
         xmldoc = etree.parse(flInput)
         
 
-        # Find all the Interlinear lines in [ce-Latn]
-        phoneme_lines = xmldoc.xpath("//m:t[parent::m:r[child::w:rPr/child::w:rStyle[contains(@w:val, 'ce-Latn')]]]", namespaces=namespaces)
-        for el in phoneme_lines:
-            # Get the text of this line
-            line = el.text.strip()
-            # Convert
-            # el.text = convert_word(line)
-            el.text = do_convert(line)
-
-
-        # Find all [Interlin Word Gloss en] lines
-        gloss_lines = xmldoc.xpath("//m:e[descendant::w:rStyle[contains(@w:val, 'Word Gloss')]]", namespaces=namespaces)
-        for gloss in gloss_lines:
-            # Get the text  of this gloss
-            text_lst = gloss.xpath("./descendant::m:t", namespaces=namespaces)
-            gloss_txt = text_lst[0].text
-            Status("Gloss = [{}]".format(gloss_txt))
-
-            # Split on period
-            # OLD gloss_parts = gloss_txt.split(".")
-
-            # Find a list of all splittable elements:'-','.'
-            gloss_break = rBreak.findall(gloss_txt)
-            gloss_parts = rBreak.split(gloss_txt)
-
-            # Remove the current <m:r> child
-            for mr in gloss.getchildren():
-                gloss.remove(mr)
-            # Walk the parts and add children respecively
-            for idx, gloss_part in enumerate(gloss_parts):
-                style = "Interlin Word Gloss en"
-                if gloss_part != gloss_part.lower():
-                    gloss_part = gloss_part.lower()
-                    style = "Interlin Morpheme Gloss en"
-                # Add the period for anything but the first element
-                if idx > 0: 
-                    # gloss_part = "." + gloss_part
-                    gloss_part = gloss_break[idx-1] + gloss_part
-                # Create a child
-                child_mr = etree.fromstring('<m:r {}><m:rPr><m:nor /></m:rPr><w:rPr><w:rStyle w:val="{}" /></w:rPr><m:t>{}</m:t></m:r>'.format(
-                    namespacestyle, style, gloss_part))
-                # Add the child to the <m:e> gloss
-                gloss.append(child_mr)
-
-        # Find all the <m:rSp m:val="3" /> instances and change the value into 2 (vertical spacing within formula's)
-        vert_spacing = xmldoc.xpath("//m:rSp[@m:val]", namespaces=namespaces)
-        for vert in vert_spacing:
-            # Change the value of the m:val attribute
-            vert.attrib['{' + namespaces['m'] + '}val'] = '2'
+        # Visit the document once: every element goes to the handlers registered for it
+        for event, elem in etree.iterwalk(xmldoc, events=("end",), tag=list(element_handlers)):
+            dispatch_element(elem)
+        Progress("glosses", progress["count"], True)
 
         # Write the result to the new XML file
         str_output = etree.tostring(xmldoc, xml_declaration=True, encoding="utf-8", pretty_print=True).decode("utf-8")
@@ -244,191 +205,269 @@ def interlinear2phonemic(oArgs):
         DoError("interlinear2phonemic")
         return False
 
-def convert_word(word):
+def rewrite_gloss(gloss):
+    """Split the text of the <m:e> [gloss] into separately styled word and morpheme gloss parts"""
+
+    # Get the text  of this gloss
+    first_t = gloss.find(".//" + tag_m_t)
+    if first_t is None:
+        return
+    gloss_txt = first_t.text or ""
+    Verbose("Gloss = [{}]".format(gloss_txt))
+    progress["count"] += 1
+    Progress("glosses", progress["count"])
+
+    # Split on period
+    # OLD gloss_parts = gloss_txt.split(".")
+
+    # Find a list of all splittable elements:'-','.'
+    gloss_break = rBreak.findall(gloss_txt)
+    gloss_parts = rBreak.split(gloss_txt)
+
+    # Remove the current <m:r> child
+    del gloss[:]
+    # Walk the parts and add children respecively
+    for idx, gloss_part in enumerate(gloss_parts):
+        style = "Interlin Word Gloss en"
+        if gloss_part != gloss_part.lower():
+            gloss_part = gloss_part.lower()
+            style = "Interlin Morpheme Gloss en"
+        # Add the period for anything but the first element
+        if idx > 0: 
+            # gloss_part = "." + gloss_part
+            gloss_part = gloss_break[idx-1] + gloss_part
+        # Add a child to the <m:e> gloss
+        append_gloss_run(gloss, style, gloss_part)
+
+
+def append_gloss_run(gloss, style, text):
+    """Append <m:r><m:rPr><m:nor/></m:rPr><w:rPr><w:rStyle w:val=[style]/></w:rPr><m:t>[text]</m:t></m:r> to [gloss]"""
+
+    child_mr = etree.SubElement(gloss, tag_m_r)
+    etree.SubElement(etree.SubElement(child_mr, tag_m_rPr), tag_m_nor)
+    etree.SubElement(etree.SubElement(child_mr, tag_rPr), tag_rStyle, {attr_w_val: style})
+    etree.SubElement(child_mr, tag_m_t).text = text
+    return child_mr
+
+
+def get_run_style(mr):
+    """Get the w:rStyle value of the <m:r> [mr] (or an empty string)"""
+
+    rPr = mr.find(tag_rPr)
+    if rPr is not None:
+        rStyle = rPr.find(tag_rStyle)
+        if rStyle is not None:
+            return rStyle.get(attr_w_val, "")
+    return ""
+
+
+def convert_latin_run(mr):
+    """Convert the text of an interlinear line in [ce-Latn]"""
+
+    for el in mr.iterchildren(tag_m_t):
+        # Convert
+        # el.text = convert_word(line)
+        el.text = do_convert((el.text or "").strip())
+
+
+def set_vertical_spacing(rSp):
+    """Change the <m:rSp m:val="3" /> into 2 (vertical spacing within formula's)"""
+
+    if attr_m_val in rSp.attrib:
+        rSp.set(attr_m_val, '2')
+
+
+# The handlers of interlinear2phonemic per tag: a list of (style, descendant, function)
+#   where the function is only called if the w:rStyle (of the element itself, or of
+#   any descendant) contains [style]
+element_handlers = {}
+# Per w:rStyle value: the set of registered [style] fragments it contains
+style_fragments = {}
+
+def register_handler(tag, func, style=None, bDescendant=False):
+    """Call [func] for every completed element [tag] (whose style contains [style])"""
+
+    element_handlers.setdefault(tag, []).append((style, bDescendant, func))
+    style_fragments.clear()
+
+def get_style_fragments(sStyle):
+    """Get the set of registered style fragments that are part of the style value [sStyle]"""
+
+    fragments = style_fragments.get(sStyle)
+    if fragments is None:
+        fragments = frozenset(style for lHandlers in element_handlers.values()
+                              for style, bDescendant, func in lHandlers
+                              if not style is None and style in sStyle)
+        style_fragments[sStyle] = fragments
+    return fragments
+
+def dispatch_element(elem):
+    """Pass the element that has just been completed on to its handlers"""
+
+    for style, bDescendant, func in element_handlers.get(elem.tag, ()):
+        if style is None:
+            func(elem)
+        elif bDescendant:
+            for rStyle in elem.iter(tag_rStyle):
+                if style in get_style_fragments(rStyle.get(attr_w_val, "")):
+                    func(elem)
+                    break
+        elif style in get_style_fragments(get_run_style(elem)):
+            func(elem)
+
+register_handler(tag_m_r, convert_latin_run, style='ce-Latn')
+register_handler(tag_m_e, rewrite_gloss, style='Word Gloss', bDescendant=True)
+register_handler(tag_m_rSp, set_vertical_spacing)
+
+
+class StreamWriter(object):
+    """Write an XML tree to [fp] while it is being parsed
+
+    The completed children of [flush_tag] elements are written and freed right away.
+    Their ancestors are written as 'shells' that declare the namespaces only once."""
+
+    def __init__(self, fp, flush_tag=tag_body, **kwargs):
+        self.fp = fp
+        self.flush_tag = flush_tag
+        self.shells = []    # (elem, shell, head, tail) of the elements opened on the output
+        return super(StreamWriter, self).__init__(**kwargs)
+
+    def serialize(self, iShell):
+        """Serialize the contents of shell [iShell]"""
+
+        oShell = self.shells[iShell]
+        sBack = etree.tostring(self.shells[0][1], encoding="utf-8", xml_declaration=False)
+        return sBack[len(oShell[2]):len(sBack)-len(oShell[3])]
+
+    def write_text(self, iShell, sText):
+        if sText:
+            shell = self.shells[iShell][1]
+            shell.text = sText
+            self.fp.write(self.serialize(iShell))
+            shell.text = None
+
+    def write_children(self, elem, upto=None, bInclusive=False):
+        """Write (and free) the children of the opened [elem], up to element [upto]"""
+
+        shell = self.shells[-1][1]
+        for child in list(elem):
+            if child is upto and not bInclusive:
+                break
+            # Moving the child into the shell takes it out of the parsed tree
+            shell.append(child)
+            self.fp.write(self.serialize(len(self.shells)-1))
+            shell.remove(child)
+            if child is upto:
+                break
+
+    def open_path(self, lPath):
+        """Make sure all elements on [lPath] (from the root down) have been opened on the output"""
+
+        for idx in range(len(self.shells), len(lPath)):
+            elem = lPath[idx]
+            if idx == 0:
+                shell = etree.Element(elem.tag, dict(elem.attrib), nsmap=elem.nsmap)
+                shell_root = shell
+            else:
+                shell_root = self.shells[0][1]
+                parent = lPath[idx-1]
+                nsmap = {k: v for k, v in elem.nsmap.items() if parent.nsmap.get(k) != v}
+                shell = etree.SubElement(self.shells[-1][1], elem.tag, dict(elem.attrib), nsmap=nsmap)
+            # Get the serialization before and after the contents of this shell
+            shell.text = "\u2063"
+            sHead, sTail = etree.tostring(shell_root, encoding="utf-8", xml_declaration=False).split(shell.text.encode("utf-8"))
+            shell.text = None
+            sPrevHead = b"" if idx == 0 else self.shells[-1][2]
+            self.shells.append((elem, shell, sHead, sTail))
+            # Write the start-tag, the text and anything before the next element on the path
+            self.fp.write(sHead[len(sPrevHead):])
+            self.write_text(idx, elem.text)
+            if idx + 1 < len(lPath):
+                self.write_children(elem, lPath[idx+1])
+
+    def end(self, elem):
+        """Process the end of [elem]"""
+
+        parent = elem.getparent()
+        if len(self.shells) > 0 and self.shells[-1][0] is elem:
+            # Close an element that has been opened on the output
+            self.write_children(elem)
+            elem_, shell, sHead, sTail = self.shells.pop()
+            if len(self.shells) == 0:
+                self.fp.write(sTail + b"\n")
+            else:
+                self.fp.write(sTail[:len(sTail)-len(self.shells[-1][3])])
+                self.shells[-1][1].remove(shell)
+                self.write_text(len(self.shells)-1, elem.tail)
+                parent.remove(elem)
+        elif parent is not None and parent.tag == self.flush_tag:
+            # A completed child of the flush element: write it (and anything before it)
+            if len(self.shells) == 0 or not self.shells[-1][0] is parent:
+                lPath = list(parent.iterancestors())
+                lPath.reverse()
+                lPath.append(parent)
+                self.open_path(lPath)
+            self.write_children(parent, elem, True)
+        elif parent is None:
+            # Nothing has been flushed: write the whole tree
+            self.fp.write(etree.tostring(elem, encoding="utf-8", xml_declaration=False) + b"\n")
+
+    def write_top(self, node):
+        """Write a comment or processing instruction outside the root"""
+
+        self.fp.write(etree.tostring(node, encoding="utf-8") + b"\n")
 
-    def trans_fits(oTrans, word, idx):
-        """Check if the word at index idx fits oTrans"""
 
-        bFound = False
-        trans = ""
-        ln = 0
-        try:
-            # Every line must have the Latin symbol(s) and the phoneme translation
-            k = oTrans['latin']
-            trans = oTrans['phoneme']
-            # Possibly get a following context
-            foll_context = oTrans.get("following")
-
-            ln = len(k)
-            # Check if line fits at all
-            bFound = (word[idx:idx+ln] == k)
-
-            # The letter fits, but is there a context?
-            if bFound and not foll_context is None:
-                # Check if the following context fits
-                foll_letter = "#" if (idx+ln) >= len(word) else word[idx+ln]
-                bFound = (foll_letter in foll_context)
-        except:
-            sMsg = get_error_message()
-            DoError("convert_word")
-
-        return bFound, trans, ln
-
-    sBack = ""
+# ----------------------------------------------------------------------------------
+# Name :    interlinear2phonemic_stream
+# Goal :    Convert the FLEX interlinear into phonemic without loading it as a whole
+# History:
+# 18/oct/2026    ERK Created
+# ----------------------------------------------------------------------------------
+def interlinear2phonemic_stream(oArgs):
+    """Convert the FLEX interlinear into phonemic, streaming from input to output file"""
+
     try:
-        # Convert to lower-case
-        word = word.lower()
-        # Visit all characters of the word
-        letter = []
-        idx = 0
-        while idx < len(word):
-            bFound = False
-            # Action depends on the character
-            for oTrans in trans_phonemic:
-                # Check if this one fits
-                bFound, trans, ln = trans_fits(oTrans, word, idx)
-                if bFound:
-                    # Use the result
-                    letter.append(trans)
-                    idx += ln
-                    bFound = True
-                    break
-            if not bFound:
-                letter.append(word[idx:idx+1])
-                idx += 1
-        sBack = "".join(letter)
-    except:
-        sMsg = get_error_message()
-        DoError("convert_word")
-    return sBack
+        flInput = oArgs.get("input", "")
+        flOutput = oArgs.get("output", "")
 
-def do_convert(sPart, options={}):
-    """Convert the string in [sPart] according to the rules for the Caucasian handbook"""
+        # Check input file
+        if not os.path.isfile(flInput):
+            Status("Please specify an input FILE")
+            return False
 
-    try:
-        # Get the list of switches
-        switches = [] if not 'switches' in options else options['switches']
-        bGeminateV = ('vv' in switches)
-        bGeminateC = ('cc' in switches)
-        bIngush = ('ingush' in switches)
-        bHw = ('hw' in switches)
-        bGh = ('gh' in switches)
-        bIpa = ('ipa' in switches)
-        bOld = False
-
-        # Treat the 'w' where it is a hw occurring after: c, ch, k, p, sh, s, t
-        sPart = re.sub(r"(ch|c|k|p|sh|s|t)w", r"\g<1>ħ",sPart)
-
-        if bGeminateC:
-            # Treat 'ww'
-            sPart = sPart.replace("ww", "ʕʕ")
-            if not bGh:
-                # Convert gh > ʁ (long and short variant)
-                sPart = sPart.replace("ggh", "ʁː").replace("gh", "ʁ").replace("Gh", "ʁ")
-            # Convert ch > č (long and short variant)
-            sPart = sPart.replace("cch", "čč").replace("ch", "č").replace("Ch", "č")
-            # Convert zh > ž (long and short variant)
-            sPart = sPart.replace("zzh", "žž").replace("zh", "ž").replace("Zh", "ž")
-            # Convert sh > š (long and short variant)
-            sPart = sPart.replace("ssh", "šš").replace("sh", "š").replace("Sh", "š")
-            if not bHw:
-                # Convert hw > ħ (long and short variant)
-                sPart = sPart.replace("hhw", "ħħ").replace("hw", "ħ").replace("Hw", "ħ")
-        else:
-            # Treat 'ww'
-            sPart = sPart.replace("ww", "ʕː")
-            if not bGh:
-                # Convert gh > ʁ (long and short variant)
-                sPart = sPart.replace("ggh", "ʁː").replace("gh", "ʁ").replace("Gh", "ʁ")
-            # Convert ch > č (long and short variant)
-            sPart = sPart.replace("cch", "čː").replace("ch", "č").replace("Ch", "č")
-            # Convert zh > ž (long and short variant)
-            sPart = sPart.replace("zzh", "žː").replace("zh", "ž").replace("Zh", "ž")
-            # Convert sh > š (long and short variant)
-            sPart = sPart.replace("ssh", "šː").replace("sh", "š").replace("Sh", "š")
-            if not bHw:
-                # Convert hw > ħ (long and short variant)
-                sPart = sPart.replace("hhw", "ħː").replace("hw", "ħ").replace("Hw", "ħ")
-        # Convert g > ɡ (any variant)
-        sPart = sPart.replace("g", "ɡ")
-        # Convert x > χ (any variant)
-        sPart = sPart.replace("x", "χ")
-        # Treat the 'w' where it occurs in other places
-        sPart = re.sub(r"[Ww]", r"ʕ",sPart)
-        # Treat double glottal stop
-        if bGeminateC:
-            sPart = sPart.replace("''", "ʔʔ")
-            sPart = sPart.replace("’’", "ʔʔ")
-        else:
-            sPart = sPart.replace("''", "ʔː")
-            sPart = sPart.replace("’’", "ʔː")
-        # Treat single glottal stop
-        sPart = re.sub(r"([aeiuoy])(['’])", r"\g<1>ʔ", sPart)
-        # Treat [rh]
-        sPart = sPart.replace("rh", "r̥")
-
-        # The [v] does NOT change!!!
-    
-        # Make sure that ejectives have the correct apostrophe
-        sPart = sPart.replace("'", "’")
-        if bGeminateV:
-            if not bIngush:
-                sPart = sPart.replace("Yy", "üː").replace("yy", "üː")
-        else:
-            # Long vowels
-            sPart = sPart.replace("Aa", "aː").replace("aa", "aː")
-            sPart = sPart.replace("Ee", "eː").replace("ee", "eː")
-            sPart = sPart.replace("Ii", "iː").replace("ii", "iː")
-            sPart = sPart.replace("Oo", "oː").replace("oo", "oː")
-            sPart = sPart.replace("Uu", "uː").replace("uu", "uː")
-            if not bIngush:
-                sPart = sPart.replace("Yy", "üː").replace("yy", "üː")
-        # Diphthong
-        if bOld:
-            sPart = sPart.replace("Ye", "üe").replace("ye", "üe")
-            sPart = sPart.replace("Oe", "üe").replace("oe", "üe")   # So /ye/ and /oe/ coincide
-            sPart = sPart.replace("Ov", "ou").replace("ov", "ou")
-            sPart = sPart.replace("Ev", "eü").replace("ev", "eü")
-            sPart = sPart.replace("Av", "au").replace("av", "au")
-        else:
-            sPart = re.sub(r"Ye(?:^[aeiouy])", r"üe", sPart)
-            sPart = re.sub(r"Oe(?:^[aeiouy])", r"üe", sPart)
-            sPart = re.sub(r"Ov(?:^[aeiouy])", r"ou", sPart)
-            sPart = re.sub(r"Ev(?:^[aeiouy])", r"eü", sPart)
-            sPart = re.sub(r"Av(?:^[aeiouy])", r"au", sPart)
-            sPart = re.sub(r"ye(?:^[aeiouy])", r"üe", sPart)
-            sPart = re.sub(r"oe(?:^[aeiouy])", r"üe", sPart)
-            sPart = re.sub(r"ov(?:^[aeiouy])", r"ou", sPart)
-            sPart = re.sub(r"ev(?:^[aeiouy])", r"eü", sPart)
-            sPart = re.sub(r"av(?:^[aeiouy])", r"au", sPart)
-            pass
-        # SHort vowels
-        if not bIngush:
-            sPart = sPart.replace("Y", "ü").replace("y", "ü")
-        # Long consonants
-        if not bGeminateC:
-            sPart = sPart.replace("bb", "bː").replace("dd", "dː").replace("gg", "gː")
-            sPart = sPart.replace("hh", "hː").replace("kk", "kː").replace("ll", "lː")
-            sPart = sPart.replace("mm", "mː").replace("nn", "nː").replace("pp", "pː")
-            sPart = sPart.replace("qq", "qː").replace("rr", "rː").replace("ss", "sː")
-            sPart = sPart.replace("tt", "tː").replace("vv", "vː").replace("xx", "xː")
-            sPart = sPart.replace("zz", "zː")
-
-        # Should we do IPA?
-        if bIpa:
-            sPart = sPart.replace("ü", "y")
-            sPart = sPart.replace("š", "ʃ")
-            sPart = sPart.replace("ž", "ʒ")
-            sPart = sPart.replace("č", "ʧ")
-            sPart = sPart.replace("c", "ʦ")
+        with open(flOutput, "wb") as fp:
+            fp.write(b"<?xml version='1.0' encoding='utf-8'?>\n")
+            oWriter = StreamWriter(fp)
+            for event, elem in etree.iterparse(flInput, events=("end", "comment", "pi"), huge_tree=True):
+                if event == "end":
+                    # Convert the element as soon as it is complete
+                    dispatch_element(elem)
+                    oWriter.end(elem)
+                elif elem.getparent() is None:
+                    # Comment or processing instruction outside the root
+                    oWriter.write_top(elem)
+        Progress("glosses", progress["count"], True)
+
+        # Return positively
+        return True
     except:
         sMsg = get_error_message()
-        DoError("do_convert")
+        DoError("interlinear2phonemic_stream")
+        return False
+
 
-    # Return what we have made of it
-    return sPart
- 
+def convert_word(word):
+    """Convert one word with the letter-by-letter phonemic table (its '#' is the end of [word])"""
+
+    return get_engine([], "phonemic").convert(word)
+
+def do_convert(sPart, options={}):
+    """Convert the string in [sPart] according to the rules for the Caucasian handbook, as used in FLEX"""
 
+    # Get the list of switches
+    switches = [] if not 'switches' in options else options['switches']
+    return get_engine(switches, "flex").convert(sPart)
 
 
 # ----------------------------------------------------------------------------------